@@ -1,16 +1,18 @@
-import json
 import logging
 import os
 import re
+import sys
+import tempfile
 import uuid
 from datetime import datetime
 
+import orjson
 from flask import Flask, jsonify, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
 from chat.service import ChatService
 from mcp.client import MCPClient
-from mcp.transport import HTTPTransport, StdioTransport, WebSocketTransport
+from mcp.transport import FRAMING_JSONL, STDIO_FRAMINGS, HTTPTransport, StdioTransport, WebSocketTransport
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -26,33 +28,74 @@ logger.info("=== Flask application starting up ===")
 MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", "10000"))
 MAX_SESSION_TITLE_LENGTH = int(os.getenv("MAX_SESSION_TITLE_LENGTH", "200"))
 
+# Server transport types and connection states; transport types read from JSON are interned to these
+TRANSPORT_STDIO = "stdio"
+TRANSPORT_HTTP = "http"
+TRANSPORT_WEBSOCKET = "websocket"
+STATUS_CONNECTED = "connected"
+STATUS_DISCONNECTED = "disconnected"
+STATUS_ERROR = "error"
+
+# Opening and closing halves of a <script>...</script> element, tolerating whitespace inside the tags
+_SCRIPT_OPEN_RE = re.compile(r"<\s*script", re.IGNORECASE)
+_SCRIPT_CLOSE_RE = re.compile(r"<\s*/\s*script\s*>", re.IGNORECASE)
+
+
+def _intern(value):
+    """Intern strings so values parsed from JSON share the constants' objects; other types pass through"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _contains_script_element(message: str) -> bool:
+    """Return True if message contains a complete script element, in linear time"""
+    # The earliest opening tag ends soonest, so a closing tag after it exists iff one exists after any
+    opening = _SCRIPT_OPEN_RE.search(message)
+    if opening is None:
+        return False
+
+    tag_end = message.find(">", opening.end())
+    return tag_end != -1 and _SCRIPT_CLOSE_RE.search(message, tag_end + 1) is not None
+
 
 def validate_chat_message(message: str) -> tuple[bool, str]:
     """Validate chat message input"""
     if not message or not isinstance(message, str):
         return False, "Message must be a non-empty string"
 
-    # Strip whitespace for length check
-    stripped_message = message.strip()
-    if not stripped_message:
-        return False, "Message cannot be empty or contain only whitespace"
-
+    # Reject oversized input before doing any work proportional to its length
     if len(message) > MAX_MESSAGE_LENGTH:
         return False, f"Message too long. Maximum length is {MAX_MESSAGE_LENGTH} characters"
 
-    # Basic HTML/script tag detection for XSS prevention
-    if re.search(r"<\s*script[^>]*>.*?<\s*/\s*script\s*>", message, re.IGNORECASE | re.DOTALL):
+    # isspace() matches exactly what strip() removes but stops at the first visible character
+    if message.isspace():
+        return False, "Message cannot be empty or contain only whitespace"
+
+    # Basic HTML/script tag detection for XSS prevention; most messages contain no tags at all
+    if "<" in message and _contains_script_element(message):
         return False, "Message contains potentially dangerous content"
 
     return True, ""
 
 
+def validate_server_config(transport_type: str, config) -> tuple[bool, str]:
+    """Validate server transport settings before they are saved"""
+    if not isinstance(config, dict):
+        return False, "Server config must be an object"
+
+    # Unknown framings would otherwise only fail when the server is connected
+    if transport_type == TRANSPORT_STDIO and config.get("framing", FRAMING_JSONL) not in STDIO_FRAMINGS:
+        return False, f"Invalid stdio framing. Must be one of: {', '.join(STDIO_FRAMINGS)}"
+
+    return True, ""
+
+
 def sanitize_html_content(content: str) -> str:
     """Basic HTML sanitization for user content"""
     if not content:
         return content
 
-    # Replace common HTML entities that could be used for XSS
+    # Replace common HTML entities that could be used for XSS. Chained str.replace beats
+    # str.translate here: each call is a C-level scan, and translate is slow for multi-char output
     content = content.replace("&", "&amp;")  # Must be first to avoid double encoding
     content = content.replace("<", "&lt;").replace(">", "&gt;")
     content = content.replace('"', "&quot;").replace("'", "&#x27;")
@@ -60,6 +103,10 @@ def sanitize_html_content(content: str) -> str:
     return content
 
 
+# Keys ServerConfig.from_dict cannot do without
+_REQUIRED_CONFIG_FIELDS = frozenset(("id", "name", "transport_type", "config"))
+
+
 class ServerConfigManager:
     """Manages persistent storage of server configurations"""
 
@@ -73,11 +120,16 @@ class ServerConfigManager:
             return {}
 
         try:
-            with open(self.config_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(self.config_file, "rb") as f:
+                data = orjson.loads(f.read())
 
             configs = {}
             for server_id, config_data in data.items():
+                # Skip incomplete entries up front instead of raising KeyError inside from_dict
+                if not isinstance(config_data, dict) or not _REQUIRED_CONFIG_FIELDS.issubset(config_data):
+                    logger.warning(f"Skipping server config {server_id}: missing required fields")
+                    continue
+
                 try:
                     configs[server_id] = ServerConfig.from_dict(config_data)
                 except Exception as e:
@@ -102,14 +154,33 @@ class ServerConfigManager:
                 config_dict.pop("status", None)  # Remove status from saved data
                 data[server_id] = config_dict
 
-            with open(self.config_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except Exception as e:
+            logger.error(f"Failed to serialize server configurations: {e}")
+            return False
+
+        # Write to a sibling temp file and rename it over the config so a crash never leaves a partial file;
+        # each save gets its own temp file because Flask may run two saves at once
+        tmp_file = None
+        try:
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            fd, tmp_file = tempfile.mkstemp(prefix=f"{os.path.basename(self.config_file)}.", suffix=".tmp", dir=config_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
 
             logger.info(f"Saved {len(configs)} server configurations to {self.config_file}")
             return True
 
         except Exception as e:
             logger.error(f"Failed to save config file {self.config_file}: {e}")
+            if tmp_file:
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
             return False
 
 
@@ -131,14 +202,32 @@ server_configs = {}
 
 
 class ServerConfig:
+    # created_at is kept as the stored ISO string until something needs the datetime
+    __slots__ = ("id", "name", "transport_type", "config", "auto_connect", "_created_at", "_created_at_iso", "status")
+
     def __init__(self, name, transport_type, config, server_id=None, auto_connect=False):
         self.id = server_id or str(uuid.uuid4())
         self.name = name
-        self.transport_type = transport_type
+        self.transport_type = _intern(transport_type)
         self.config = config
         self.auto_connect = auto_connect
-        self.created_at = datetime.now()
-        self.status = "disconnected"
+        self._created_at = datetime.now()
+        self._created_at_iso = None
+        self.status = STATUS_DISCONNECTED
+
+    @property
+    def created_at(self):
+        if self._created_at is None:
+            try:
+                self._created_at = datetime.fromisoformat(self._created_at_iso.replace("Z", "+00:00"))
+            except ValueError:
+                self.created_at = datetime.now()
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+        self._created_at_iso = None
 
     def to_dict(self):
         return {
@@ -147,21 +236,13 @@ class ServerConfig:
             "transport_type": self.transport_type,
             "config": self.config,
             "auto_connect": self.auto_connect,
-            "created_at": self.created_at.isoformat(),
+            "created_at": self._created_at_iso or self.created_at.isoformat(),
             "status": self.status,
         }
 
     @classmethod
     def from_dict(cls, data):
         """Create ServerConfig from dictionary data"""
-        created_at = data.get("created_at")
-        if isinstance(created_at, str):
-            # Parse ISO format datetime string
-            try:
-                created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-            except ValueError:
-                created_at = datetime.now()
-
         instance = cls(
             name=data["name"],
             transport_type=data["transport_type"],
@@ -170,7 +251,13 @@ class ServerConfig:
             auto_connect=data.get("auto_connect", False),
         )
 
-        if created_at:
+        created_at = data.get("created_at")
+        if isinstance(created_at, str) and created_at:
+            # Keep the ISO string as loaded; it is parsed only if created_at is read, so an
+            # unparseable value is served as-is until then and replaced with now() on first read
+            instance._created_at = None
+            instance._created_at_iso = created_at
+        elif created_at:
             instance.created_at = created_at
 
         return instance
@@ -192,19 +279,20 @@ def auto_connect_servers():
 
                 # Create transport based on type
                 transport = None
-                if server_config.transport_type == "stdio":
+                if server_config.transport_type == TRANSPORT_STDIO:
                     transport = StdioTransport(
                         command=server_config.config.get("command", ""),
                         args=server_config.config.get("args", []),
                         cwd=server_config.config.get("cwd"),
+                        framing=server_config.config.get("framing", FRAMING_JSONL),
                     )
-                elif server_config.transport_type == "http":
+                elif server_config.transport_type == TRANSPORT_HTTP:
                     transport = HTTPTransport(
                         url=server_config.config.get("url", ""),
                         headers=server_config.config.get("headers", {}),
                         timeout=server_config.config.get("timeout", 30),
                     )
-                elif server_config.transport_type == "websocket":
+                elif server_config.transport_type == TRANSPORT_WEBSOCKET:
                     transport = WebSocketTransport(
                         url=server_config.config.get("url", ""),
                         protocols=server_config.config.get("protocols", []),
@@ -228,12 +316,12 @@ def auto_connect_servers():
                 )
 
                 active_clients[server_id] = client
-                server_config.status = "connected"
+                server_config.status = STATUS_CONNECTED
                 logger.info(f"Successfully auto-connected to server: {server_config.name}")
 
             except Exception as e:
                 logger.error(f"Failed to auto-connect to server {server_config.name}: {e}")
-                server_config.status = "error"
+                server_config.status = STATUS_ERROR
 
 
 # Auto-connect to servers on startup
@@ -285,6 +373,10 @@ def create_server():
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
 
+        is_valid, error_message = validate_server_config(data["transport_type"], data["config"])
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+
         # Create server configuration
         server_config = ServerConfig(
             name=data["name"],
@@ -316,11 +408,17 @@ def update_server(server_id):
         data = request.get_json()
         server_config = server_configs[server_id]
 
+        is_valid, error_message = validate_server_config(
+            data.get("transport_type", server_config.transport_type), data.get("config", server_config.config)
+        )
+        if not is_valid:
+            return jsonify({"error": error_message}), 400
+
         # Update fields if provided
         if "name" in data:
             server_config.name = data["name"]
         if "transport_type" in data:
-            server_config.transport_type = data["transport_type"]
+            server_config.transport_type = _intern(data["transport_type"])
         if "config" in data:
             server_config.config = data["config"]
         if "auto_connect" in data:
@@ -373,19 +471,20 @@ def connect_server(server_id):
 
         # Create transport based on type
         transport = None
-        if server_config.transport_type == "stdio":
+        if server_config.transport_type == TRANSPORT_STDIO:
             transport = StdioTransport(
                 command=server_config.config.get("command", ""),
                 args=server_config.config.get("args", []),
                 cwd=server_config.config.get("cwd"),
+                framing=server_config.config.get("framing", FRAMING_JSONL),
             )
-        elif server_config.transport_type == "http":
+        elif server_config.transport_type == TRANSPORT_HTTP:
             transport = HTTPTransport(
                 url=server_config.config.get("url", ""),
                 headers=server_config.config.get("headers", {}),
                 timeout=server_config.config.get("timeout", 30),
             )
-        elif server_config.transport_type == "websocket":
+        elif server_config.transport_type == TRANSPORT_WEBSOCKET:
             transport = WebSocketTransport(
                 url=server_config.config.get("url", ""),
                 protocols=server_config.config.get("protocols", []),
@@ -408,13 +507,13 @@ def connect_server(server_id):
         )
 
         active_clients[server_id] = client
-        server_config.status = "connected"
+        server_config.status = STATUS_CONNECTED
 
         return jsonify({"message": "Connected successfully", "server_info": init_result})
 
     except Exception as e:
         logger.error(f"Error connecting to server: {e}")
-        server_configs[server_id].status = "error"
+        server_configs[server_id].status = STATUS_ERROR
         return jsonify({"error": str(e)}), 500
 
 
@@ -429,7 +528,7 @@ def disconnect_server(server_id):
         del active_clients[server_id]
 
         if server_id in server_configs:
-            server_configs[server_id].status = "disconnected"
+            server_configs[server_id].status = STATUS_DISCONNECTED
 
         return jsonify({"message": "Disconnected successfully"})
 
@@ -449,19 +548,20 @@ def test_connection(server_id):
 
         # Create temporary transport for testing
         transport = None
-        if server_config.transport_type == "stdio":
+        if server_config.transport_type == TRANSPORT_STDIO:
             transport = StdioTransport(
                 command=server_config.config.get("command", ""),
                 args=server_config.config.get("args", []),
                 cwd=server_config.config.get("cwd"),
+                framing=server_config.config.get("framing", FRAMING_JSONL),
             )
-        elif server_config.transport_type == "http":
+        elif server_config.transport_type == TRANSPORT_HTTP:
             transport = HTTPTransport(
                 url=server_config.config.get("url", ""),
                 headers=server_config.config.get("headers", {}),
                 timeout=server_config.config.get("timeout", 30),
             )
-        elif server_config.transport_type == "websocket":
+        elif server_config.transport_type == TRANSPORT_WEBSOCKET:
             transport = WebSocketTransport(
                 url=server_config.config.get("url", ""),
                 protocols=server_config.config.get("protocols", []),
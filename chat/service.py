@@ -1,15 +1,19 @@
 """
 Chat service for integrating with Claude and MCP servers
 """
-import json
 import logging
 import os
 import re
+import sys
+import time
 import uuid
+import weakref
 from datetime import datetime
+from operator import attrgetter
 from typing import Any, Dict, List, Optional
 
 import anthropic
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +21,48 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
 DEFAULT_MAX_TOKENS = int(os.getenv("CLAUDE_MAX_TOKENS", "4000"))
 MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", "10000"))
+# Seconds a server's tool listing is reused; HTTP servers cannot send notifications/tools/list_changed
+TOOLS_CACHE_TTL = float(os.getenv("TOOLS_CACHE_TTL", "60"))
+
+# Message roles forwarded to the Claude API; system messages are sent separately
+_CLAUDE_ROLES = frozenset(("user", "assistant"))
+
+# Pretty-printed JSON for tool results; non-string keys are stringified like the stdlib does
+_JSON_INDENT_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+# Anthropic API key format, checked after the cheaper prefix and length tests
+_API_KEY_RE = re.compile(r"^sk-ant-[A-Za-z0-9_-]+$")
+
+# Used when an MCP tool declares no inputSchema; copied before use, never modified
+_EMPTY_INPUT_SCHEMA = {"type": "object"}
+
+
+def _dumps_indented(data: Any) -> str:
+    """Serialize data as two-space indented JSON, falling back to str() for unsupported values"""
+    return orjson.dumps(data, option=_JSON_INDENT_OPTIONS, default=str).decode()
 
 
 class ChatMessage:
     """Represents a single chat message"""
 
-    def __init__(self, role: str, content: str, timestamp: Optional[datetime] = None, message_id: Optional[str] = None):
+    __slots__ = ("id", "role", "content", "timestamp", "tool_calls", "tool_results")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        timestamp: Optional[datetime] = None,
+        message_id: Optional[str] = None,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        tool_results: Optional[List[Dict[str, Any]]] = None,
+    ):
         self.id = message_id or str(uuid.uuid4())
-        self.role = role  # 'user', 'assistant', 'system'
+        # Interned so messages parsed from JSON share one string per role and compare by identity
+        self.role = sys.intern(role)  # 'user', 'assistant', 'system'
         self.content = content
         self.timestamp = timestamp or datetime.now()
-        self.tool_calls = []
-        self.tool_results = []
+        self.tool_calls = tool_calls if tool_calls is not None else []
+        self.tool_results = tool_results if tool_results is not None else []
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -43,38 +77,60 @@ class ChatMessage:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "ChatMessage":
         timestamp = datetime.fromisoformat(data["timestamp"]) if data.get("timestamp") else datetime.now()
-        message = cls(role=data["role"], content=data["content"], timestamp=timestamp, message_id=data["id"])
-        message.tool_calls = data.get("tool_calls", [])
-        message.tool_results = data.get("tool_results", [])
-        return message
+        return cls(
+            role=data["role"],
+            content=data["content"],
+            timestamp=timestamp,
+            message_id=data["id"],
+            tool_calls=data.get("tool_calls"),
+            tool_results=data.get("tool_results"),
+        )
 
 
 class ChatSession:
     """Represents a chat session with conversation history"""
 
+    # updated_at is kept as wall-clock nanoseconds and only turned into a datetime when read
+    __slots__ = ("id", "title", "messages", "created_at", "_updated_ns", "_updated_at", "active_server_ids")
+
     def __init__(self, session_id: Optional[str] = None, title: Optional[str] = None):
         self.id = session_id or str(uuid.uuid4())
         self.title = title or "New Chat"
         self.messages: List[ChatMessage] = []
         self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        self._updated_ns = time.time_ns()
+        self._updated_at: Optional[datetime] = None
         self.active_server_ids: List[str] = []
 
+    @property
+    def updated_at(self) -> datetime:
+        if self._updated_at is None:
+            seconds, nanos = divmod(self._updated_ns, 1_000_000_000)
+            self._updated_at = datetime.fromtimestamp(seconds).replace(microsecond=nanos // 1000)
+        return self._updated_at
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        self._updated_ns = round(value.timestamp() * 1_000_000) * 1000
+        self._updated_at = value
+
+    @property
+    def updated_ns(self) -> int:
+        """Last update time in nanoseconds since the epoch; a cheap sort key for recency"""
+        return self._updated_ns
+
     def add_message(self, message: ChatMessage):
         """Add a message to the session"""
         self.messages.append(message)
-        self.updated_at = datetime.now()
+        # Step at least a microsecond so updated_at strictly increases even if the clock does not
+        self._updated_ns = max(time.time_ns(), self._updated_ns + 1000)
+        self._updated_at = None
 
     def get_messages_for_claude(self) -> List[Dict[str, Any]]:
         """Convert messages to Claude API format"""
-        claude_messages = []
-
-        for message in self.messages:
-            if message.role in ["user", "assistant"]:
-                claude_message = {"role": message.role, "content": message.content}
-                claude_messages.append(claude_message)
-
-        return claude_messages
+        return [
+            {"role": message.role, "content": message.content} for message in self.messages if message.role in _CLAUDE_ROLES
+        ]
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -120,6 +176,8 @@ class ChatService:
 
         self.sessions: Dict[str, ChatSession] = {}
         self.mcp_clients = {}  # Will be injected by the main app
+        # Per-server tool listings with a weak ref to the client, its tool version and an expiry time
+        self._tools_cache: Dict[str, tuple] = {}
 
     def _validate_api_key(self, api_key: str) -> bool:
         """Validate Anthropic API key format"""
@@ -139,7 +197,7 @@ class ChatService:
             return False
 
         # Check format - should contain alphanumeric and some special chars
-        if not re.match(r"^sk-ant-[A-Za-z0-9_-]+$", api_key):
+        if not _API_KEY_RE.match(api_key):
             return False
 
         return True
@@ -163,6 +221,7 @@ class ChatService:
     def set_mcp_clients(self, mcp_clients: Dict[str, Any]):
         """Set the MCP clients reference from the main app"""
         self.mcp_clients = mcp_clients
+        self._tools_cache.clear()
 
     def create_session(self, title: Optional[str] = None) -> ChatSession:
         """Create a new chat session"""
@@ -176,7 +235,8 @@ class ChatService:
         return self.sessions.get(session_id)
 
     def list_sessions(self) -> List[Dict[str, Any]]:
-        """List all chat sessions"""
+        """List all chat sessions, most recently updated first"""
+        # Compare the raw nanosecond stamps instead of datetimes
         return [
             {
                 "id": session.id,
@@ -185,7 +245,7 @@ class ChatService:
                 "updated_at": session.updated_at.isoformat(),
                 "message_count": len(session.messages),
             }
-            for session in self.sessions.values()
+            for session in sorted(self.sessions.values(), key=attrgetter("updated_ns"), reverse=True)
         ]
 
     def delete_session(self, session_id: str) -> bool:
@@ -204,41 +264,64 @@ class ChatService:
         for server_id in server_ids:
             if server_id in self.mcp_clients:
                 try:
-                    client = self.mcp_clients[server_id]
-                    tools_response = client.list_tools()
-                    server_tools = tools_response.get("tools", [])
+                    server_tools, server_schemas = self._get_server_tools(server_id, self.mcp_clients[server_id])
 
                     available_tools[server_id] = server_tools
-
-                    # Convert MCP tool schemas to Claude function calling format
-                    for tool in server_tools:
-                        claude_tool = self._convert_mcp_tool_to_claude_function(tool, server_id)
-                        tool_schemas.append(claude_tool)
+                    tool_schemas.extend(server_schemas)
 
                 except Exception as e:
                     logger.error(f"Failed to get tools from server {server_id}: {e}")
 
         return {"available_tools": available_tools, "claude_tool_schemas": tool_schemas}
 
+    def _get_server_tools(self, server_id: str, client: Any) -> tuple:
+        """List one server's tools and their Claude schemas, reusing a cached listing while it is current"""
+        # A cached listing is current while the same client object serves the server, that client has not
+        # reported a tool list change, and the entry has not expired; a reconnect replaces the client
+        now = time.monotonic()
+        cached = self._tools_cache.get(server_id)
+        if cached is not None:
+            client_ref, tools_version, expires_at, server_tools, server_schemas = cached
+            if client_ref() is client and tools_version == client.tools_version and now < expires_at:
+                return server_tools, server_schemas
+
+        # Read the version first so a change notified while listing invalidates this entry
+        tools_version = client.tools_version
+        server_tools = client.list_tools().get("tools", [])
+
+        # Convert MCP tool schemas to Claude function calling format
+        server_schemas = [self._convert_mcp_tool_to_claude_function(tool, server_id) for tool in server_tools]
+
+        # Failed listings raise before this point and are retried on the next call rather than cached.
+        # The weak reference means the cache never keeps a disconnected client alive
+        self._tools_cache[server_id] = (
+            weakref.ref(client),
+            tools_version,
+            now + TOOLS_CACHE_TTL,
+            server_tools,
+            server_schemas,
+        )
+        return server_tools, server_schemas
+
     def _convert_mcp_tool_to_claude_function(self, mcp_tool: Dict[str, Any], server_id: str) -> Dict[str, Any]:
         """Convert MCP tool schema to Claude function calling format"""
-        function_schema = {
-            "name": f"{server_id}_{mcp_tool['name']}",
-            "description": mcp_tool.get("description", f"Tool {mcp_tool['name']} from server {server_id}"),
-            "input_schema": mcp_tool.get("inputSchema", {"type": "object", "properties": {}}),
-        }
+        # Shallow-copy the schema and its properties so the client's own tool listing is never modified
+        input_schema = dict(mcp_tool.get("inputSchema") or _EMPTY_INPUT_SCHEMA)
+        properties = dict(input_schema.get("properties") or {})
 
         # Add server_id to the schema for tool routing
-        if "properties" not in function_schema["input_schema"]:
-            function_schema["input_schema"]["properties"] = {}
-
-        function_schema["input_schema"]["properties"]["_mcp_server_id"] = {
+        properties["_mcp_server_id"] = {
             "type": "string",
             "const": server_id,
             "description": "Internal: MCP server ID (auto-filled)",
         }
+        input_schema["properties"] = properties
 
-        return function_schema
+        return {
+            "name": f"{server_id}_{mcp_tool['name']}",
+            "description": mcp_tool.get("description", f"Tool {mcp_tool['name']} from server {server_id}"),
+            "input_schema": input_schema,
+        }
 
     def send_message(self, session_id: str, user_message: str, server_ids: List[str] = None) -> ChatMessage:
         """Send a message and get Claude's response with MCP tool integration"""
@@ -396,27 +479,22 @@ class ChatService:
                     content_parts.append(f"\n[Tool: {content.name}]\nError: {str(e)}")
 
         # Create assistant message
-        assistant_message = ChatMessage("assistant", "\n".join(content_parts))
-        assistant_message.tool_calls = tool_calls
-        assistant_message.tool_results = tool_results
-
-        return assistant_message
+        return ChatMessage("assistant", "\n".join(content_parts), tool_calls=tool_calls, tool_results=tool_results)
 
     def _execute_mcp_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Any:
         """Execute an MCP tool call"""
         # Parse server_id and tool_name from the function name
-        if "_" not in tool_name:
+        server_id, sep, actual_tool_name = tool_name.partition("_")
+        if not sep:
             raise ValueError(f"Invalid tool name format: {tool_name}")
 
-        server_id, actual_tool_name = tool_name.split("_", 1)
-
-        if server_id not in self.mcp_clients:
+        client = self.mcp_clients.get(server_id)
+        if client is None:
             raise ValueError(f"MCP server {server_id} not connected")
 
-        client = self.mcp_clients[server_id]
-
-        # Remove the internal _mcp_server_id parameter
-        clean_input = {k: v for k, v in tool_input.items() if k != "_mcp_server_id"}
+        # Remove the internal _mcp_server_id parameter without touching the caller's dict
+        clean_input = dict(tool_input)
+        clean_input.pop("_mcp_server_id", None)
 
         # Call the MCP tool
         result = client.call_tool(actual_tool_name, clean_input)
@@ -430,14 +508,13 @@ class ChatService:
         # Handle different types of results
         if isinstance(result, str):
             # If it's already a string, check if it looks like structured data
-            if result.strip().startswith("{") or result.strip().startswith("["):
+            stripped = result.strip()
+            if stripped[:1] in ("{", "["):
                 try:
-                    parsed = json.loads(result)
-                    return self._format_structured_data(parsed)
-                except json.JSONDecodeError:
-                    return f"Result: {result}"
-            else:
-                return f"Result: {result}"
+                    return self._format_structured_data(orjson.loads(stripped))
+                except orjson.JSONDecodeError:
+                    pass
+            return f"Result: {result}"
 
         elif isinstance(result, (dict, list)):
             return self._format_structured_data(result)
@@ -453,13 +530,10 @@ class ChatService:
 
             # For small dictionaries, format as key-value pairs
             if len(data) <= 5 and all(isinstance(v, (str, int, float, bool, type(None))) for v in data.values()):
-                formatted_items = []
-                for key, value in data.items():
-                    formatted_items.append(f"  • {key}: {value}")
-                return "Result:\n" + "\n".join(formatted_items)
+                return "Result:\n" + "\n".join([f"  • {key}: {value}" for key, value in data.items()])
 
             # For larger or complex dictionaries, use JSON with indentation
-            return f"Result: {json.dumps(data, indent=2)}"
+            return f"Result: {_dumps_indented(data)}"
 
         elif isinstance(data, list):
             if len(data) == 0:
@@ -467,27 +541,27 @@ class ChatService:
 
             # For simple lists of strings/numbers, format as bullet points
             if len(data) <= 10 and all(isinstance(item, (str, int, float)) for item in data):
-                formatted_items = [f"  • {item}" for item in data]
-                return "Result:\n" + "\n".join(formatted_items)
+                return "Result:\n" + "\n".join([f"  • {item}" for item in data])
 
             # For complex lists, use JSON
-            return f"Result: {json.dumps(data, indent=2)}"
+            return f"Result: {_dumps_indented(data)}"
 
         else:
-            return f"Result: {json.dumps(data, indent=2)}"
+            return f"Result: {_dumps_indented(data)}"
 
     def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get a summary of a chat session"""
-        session = self.get_session(session_id)
-        if not session:
+        session = self.sessions.get(session_id)
+        if session is None:
             return None
 
+        messages = session.messages
         return {
             "id": session.id,
             "title": session.title,
-            "message_count": len(session.messages),
+            "message_count": len(messages),
             "created_at": session.created_at.isoformat(),
             "updated_at": session.updated_at.isoformat(),
             "active_servers": session.active_server_ids,
-            "last_message": session.messages[-1].content if session.messages else None,
+            "last_message": messages[-1].content if messages else None,
         }
@@ -6,7 +6,16 @@ import threading
 import uuid
 from typing import Any, Dict, Optional
 
-from .protocol import MCPCapabilities, MCPError, MCPNotification, MCPRequest, MCPResponse, validate_message, validate_tool_call
+from .protocol import (
+    MCPCapabilities,
+    MCPError,
+    MCPNotification,
+    MCPRequest,
+    MCPResponse,
+    MessageType,
+    validate_message,
+    validate_tool_call,
+)
 from .transport import MCPTransport
 
 logger = logging.getLogger(__name__)
@@ -24,6 +33,8 @@ class MCPClient:
         self.client_capabilities = MCPCapabilities()
         self.initialized = False
         self.lock = threading.Lock()
+        # Bumped whenever the server reports its tool list changed, so cached listings can be invalidated
+        self.tools_version = 0
 
         # Set up message handling
         self.transport.set_message_handler(self._handle_message)
@@ -188,6 +199,11 @@ class MCPClient:
         # Create request message
         request = MCPRequest(method, params, request_id)
 
+        # Register the waiter before sending so a fast reply from the reader thread is not lost
+        with self.lock:
+            event = threading.Event()
+            self.pending_requests[request_id] = event
+
         try:
             # Send request - check if transport returns response directly (HTTP) or async (WebSocket/stdio)
             result = self.transport.send_message(request.to_dict())
@@ -197,30 +213,23 @@ class MCPClient:
                 return result
 
             # Otherwise, use async pattern for WebSocket/stdio transports
-            # Set up response waiting
-            with self.lock:
-                event = threading.Event()
-                self.pending_requests[request_id] = event
-
-            try:
-                # Wait for response
-                if event.wait(timeout):
-                    with self.lock:
-                        response = self.request_responses.pop(request_id, {})
-                        return response
-                else:
-                    raise TimeoutError(f"Request {request_id} timed out after {timeout} seconds")
-
-            finally:
-                # Clean up
+            if event.wait(timeout):
                 with self.lock:
-                    self.pending_requests.pop(request_id, None)
-                    self.request_responses.pop(request_id, None)
+                    response = self.request_responses.pop(request_id, {})
+                    return response
+            else:
+                raise TimeoutError(f"Request {request_id} timed out after {timeout} seconds")
 
         except Exception as e:
             logger.error(f"Error sending request {request_id}: {e}")
             raise
 
+        finally:
+            # Clean up
+            with self.lock:
+                self.pending_requests.pop(request_id, None)
+                self.request_responses.pop(request_id, None)
+
     def _send_notification(self, method: str, params: Dict[str, Any]) -> None:
         """Send a notification (no response expected)"""
         notification = MCPNotification(method, params)
@@ -237,26 +246,26 @@ class MCPClient:
 
         # HTTP transport might return a response even for notifications
         if result is not None:
-            logger.debug(f"Notification '{method}' received response: {result}")
+            logger.debug("Notification '%s' received response: %s", method, result)
         else:
             logger.debug(f"Sent notification '{method}' (no response expected)")
 
     def _handle_message(self, message: Dict[str, Any]) -> None:
         """Handle incoming message from server"""
         try:
-            # Validate message format
-            validate_message(message)
+            # Validate message format; validation already tells us the message type
+            message_type = validate_message(message)
 
             # Handle response messages
-            if "id" in message and ("result" in message or "error" in message):
+            if message_type is MessageType.RESPONSE:
                 self._handle_response(message)
 
             # Handle notification messages
-            elif "method" in message and "id" not in message:
+            elif message_type is MessageType.NOTIFICATION:
                 self._handle_notification(message)
 
             # Handle request messages (if server sends any)
-            elif "method" in message and "id" in message:
+            else:
                 self._handle_request(message)
 
         except Exception as e:
@@ -287,6 +296,8 @@ class MCPClient:
             self._handle_progress_notification(params)
         elif method == "logging":
             self._handle_logging_notification(params)
+        elif method == "notifications/tools/list_changed":
+            self.tools_version += 1
         else:
             logger.debug(f"Unhandled notification: {method}")
 
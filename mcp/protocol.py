@@ -195,8 +195,8 @@ class MCPPrompt:
 # Protocol validation functions
 
 
-def validate_message(data: Dict[str, Any]) -> None:
-    """Validate MCP message format"""
+def validate_message(data: Dict[str, Any]) -> MessageType:
+    """Validate MCP message format and return its message type"""
     if not isinstance(data, dict):
         raise MCPError(MCPError.INVALID_REQUEST, "Message must be a JSON object")
 
@@ -212,6 +212,8 @@ def validate_message(data: Dict[str, Any]) -> None:
         if "params" in data and not isinstance(data["params"], dict):
             raise MCPError(MCPError.INVALID_PARAMS, "Params must be an object")
 
+        return MessageType.REQUEST if "id" in data else MessageType.NOTIFICATION
+
     elif "result" in data or "error" in data:
         # Response
         if "id" not in data:
@@ -220,6 +222,8 @@ def validate_message(data: Dict[str, Any]) -> None:
         if "result" in data and "error" in data:
             raise MCPError(MCPError.INVALID_REQUEST, "Response cannot have both result and error")
 
+        return MessageType.RESPONSE
+
     else:
         raise MCPError(MCPError.INVALID_REQUEST, "Invalid message format")
 
@@ -1,19 +1,50 @@
 """
 MCP Transport layer implementations
 """
-import json
 import logging
-import queue
+import os
 import subprocess
-import threading
+import sys
 from abc import ABC, abstractmethod
 from typing import Any, Callable, Dict, Optional
 
+import orjson
 import requests
 import websocket
 
+from .transport_loop import handler_pool, reactor
+
+# Optional: with httpx and h2 installed, HTTP transports multiplex requests over HTTP/2
+try:
+    import h2  # noqa: F401
+    import httpx
+except ImportError:
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
+# Stdio framing modes: newline-delimited JSON (MCP default) or 4-byte big-endian length prefix + JSON
+FRAMING_JSONL = "jsonl"
+FRAMING_LENGTH_PREFIXED = "length-prefixed"
+STDIO_FRAMINGS = (FRAMING_JSONL, FRAMING_LENGTH_PREFIXED)
+
+READ_CHUNK_SIZE = 65536
+
+# Largest length-prefixed frame we will buffer; a bigger length is treated as a misbehaving server
+MAX_FRAME_SIZE = 32 * 1024 * 1024
+
+# POSIX pipes can be switched to non-blocking mode and drained fully on each readiness event
+NONBLOCKING_PIPES = os.name == "posix"
+
+# Linux lets us grow the kernel pipe buffer (64 KiB by default) so large messages need fewer syscalls
+PIPE_BUFFER_SIZE = 1 << 20
+if sys.platform.startswith("linux"):
+    import fcntl
+
+    F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)  # constant only exported from Python 3.10
+else:
+    F_SETPIPE_SZ = None
+
 
 class MCPTransport(ABC):
     """Abstract base class for MCP transports"""
@@ -45,15 +76,20 @@ class MCPTransport(ABC):
 class StdioTransport(MCPTransport):
     """Standard input/output transport for MCP"""
 
-    def __init__(self, command: str, args: list = None, cwd: str = None):
+    def __init__(self, command: str, args: list = None, cwd: str = None, framing: str = FRAMING_JSONL):
         super().__init__()
+        if framing not in STDIO_FRAMINGS:
+            raise ValueError(f"Unsupported stdio framing: {framing}")
+
         self.command = command
         self.args = args or []
         self.cwd = cwd
+        self.framing = framing
         self.process: Optional[subprocess.Popen] = None
-        self.reader_thread: Optional[threading.Thread] = None
-        self.message_queue = queue.Queue()
         self.running = False
+        self.read_buffer = bytearray()
+        self.scan_offset = 0
+        self.discard_remaining = 0
 
     def connect(self) -> None:
         """Start the MCP server process and establish stdio connection"""
@@ -62,16 +98,24 @@ class StdioTransport(MCPTransport):
             cmd = [self.command] + self.args
 
             # Start process
+            # Bytes mode: stdout is read straight off the fd and stdin takes pre-encoded frames
             self.process = subprocess.Popen(
-                cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.cwd, text=True, bufsize=0
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.cwd
             )
 
+            self._grow_pipe_buffers()
+
             self.running = True
             self.connected = True
+            self.read_buffer.clear()
+            self.scan_offset = 0
+            self.discard_remaining = 0
 
-            # Start reader thread
-            self.reader_thread = threading.Thread(target=self._read_messages, daemon=True)
-            self.reader_thread.start()
+            if NONBLOCKING_PIPES:
+                os.set_blocking(self.process.stdout.fileno(), False)
+
+            # Let the shared reactor watch stdout instead of starting a reader thread per server
+            reactor.register(self.process.stdout, self._on_readable)
 
             logger.info(f"Connected to MCP server via stdio: {self.command}")
 
@@ -79,12 +123,26 @@ class StdioTransport(MCPTransport):
             logger.error(f"Failed to connect via stdio: {e}")
             raise
 
+    def _grow_pipe_buffers(self) -> None:
+        """Enlarge the stdin/stdout pipe buffers where the platform allows it"""
+        if F_SETPIPE_SZ is None:
+            return
+
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                fcntl.fcntl(pipe.fileno(), F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+            except OSError as e:
+                # Capped by /proc/sys/fs/pipe-max-size for unprivileged processes
+                logger.debug(f"Could not resize stdio pipe buffer: {e}")
+
     def disconnect(self) -> None:
         """Terminate the MCP server process"""
         self.running = False
         self.connected = False
 
         if self.process:
+            reactor.unregister(self.process.stdout)
+
             try:
                 self.process.terminate()
                 self.process.wait(timeout=5)
@@ -94,9 +152,6 @@ class StdioTransport(MCPTransport):
 
             self.process = None
 
-        if self.reader_thread and self.reader_thread.is_alive():
-            self.reader_thread.join(timeout=1)
-
         logger.info("Disconnected from MCP server via stdio")
 
     def send_message(self, message: Dict[str, Any]) -> None:
@@ -105,42 +160,110 @@ class StdioTransport(MCPTransport):
             raise RuntimeError("Not connected to MCP server")
 
         try:
-            json_message = json.dumps(message) + "\n"
-            self.process.stdin.write(json_message)
+            payload = orjson.dumps(message)
+            if self.framing == FRAMING_LENGTH_PREFIXED:
+                self.process.stdin.write(len(payload).to_bytes(4, "big") + payload)
+            else:
+                self.process.stdin.write(payload + b"\n")
             self.process.stdin.flush()
 
-            logger.debug(f"Sent message via stdio: {message}")
+            logger.debug("Sent message via stdio: %s", message)
             return None  # Async transport - response comes via message handler
 
         except Exception as e:
             logger.error(f"Failed to send message via stdio: {e}")
             raise
 
-    def _read_messages(self) -> None:
-        """Read messages from MCP server stdout in separate thread"""
-        while self.running and self.process:
-            try:
-                line = self.process.stdout.readline()
-                if not line:
-                    break
-
-                line = line.strip()
-                if line:
-                    try:
-                        message = json.loads(line)
-                        if self.message_handler:
-                            self.message_handler(message)
+    def _on_readable(self, stdout) -> None:
+        """Read available output from the MCP server process (called from the reactor thread)"""
+        eof = self._fill_read_buffer(stdout.fileno())
 
-                        logger.debug(f"Received message via stdio: {message}")
+        if self.framing == FRAMING_LENGTH_PREFIXED:
+            self._drain_length_prefixed()
+        else:
+            self._drain_lines()
 
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Invalid JSON received via stdio: {line}, error: {e}")
+        if eof:
+            reactor.unregister(stdout)
 
-            except Exception as e:
+    def _fill_read_buffer(self, fd: int) -> bool:
+        """Pull everything the pipe currently holds into the read buffer; returns True at EOF"""
+        while True:
+            try:
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+            except BlockingIOError:
+                return False
+            except OSError as e:
                 if self.running:
                     logger.error(f"Error reading from stdio: {e}")
+                return True
+
+            if not chunk:
+                return True
+
+            self.read_buffer += chunk
+
+            # A short read means the pipe is drained; blocking pipes must not be read again
+            if len(chunk) < READ_CHUNK_SIZE or not NONBLOCKING_PIPES:
+                return False
+
+    def _drain_lines(self) -> None:
+        """Dispatch every complete newline-terminated message in the read buffer"""
+        buffer = self.read_buffer
+        find = buffer.find
+        handle_payload = self._handle_payload
+        start = 0
+        # Bytes before scan_offset were already searched, so a message spanning many chunks is scanned once
+        newline = find(b"\n", self.scan_offset)
+        while newline >= 0:
+            line = buffer[start:newline].strip()
+            if line:
+                handle_payload(line)
+
+            start = newline + 1
+            newline = find(b"\n", start)
+
+        del buffer[:start]
+        self.scan_offset = len(buffer)
+
+    def _drain_length_prefixed(self) -> None:
+        """Dispatch every complete length-prefixed frame in the read buffer"""
+        buffer = self.read_buffer
+        # Finish skipping an oversized frame before looking for the next header
+        offset = min(self.discard_remaining, len(buffer))
+        self.discard_remaining -= offset
+        size = len(buffer)
+        handle_payload = self._handle_payload
+        while size - offset >= 4:
+            length = int.from_bytes(buffer[offset : offset + 4], "big")
+            if length > MAX_FRAME_SIZE:
+                logger.error(f"Dropping {length}-byte stdio frame, larger than the {MAX_FRAME_SIZE}-byte limit")
+                skipped = min(4 + length, size - offset)
+                self.discard_remaining = 4 + length - skipped
+                offset += skipped
+                continue
+
+            end = offset + 4 + length
+            if size < end:
                 break
 
+            handle_payload(buffer[offset + 4 : end])
+            offset = end
+
+        del buffer[:offset]
+
+    def _handle_payload(self, payload: bytearray) -> None:
+        """Decode a single message and pass it to the message handler"""
+        try:
+            message = orjson.loads(payload)
+            if self.message_handler:
+                handler_pool.submit(self.message_handler, message)
+
+            logger.debug("Received message via stdio: %s", message)
+
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Invalid JSON received via stdio: {payload}, error: {e}")
+
 
 class HTTPTransport(MCPTransport):
     """HTTP transport for MCP"""
@@ -155,48 +278,38 @@ class HTTPTransport(MCPTransport):
         self.url = url
         self.headers = headers or {}
         self.timeout = timeout
-        self.session = requests.Session()
-
-        logger.info(f"HTTPTransport initialized with URL: {self.url}")
-
-    def connect(self) -> None:
-        """Test connection to HTTP MCP server"""
-        try:
-            logger.info(f"Attempting to connect to MCP server at: {self.url}")
 
-            # Test connection with an initialize request to verify MCP compatibility
-            test_message = {
-                "jsonrpc": "2.0",
-                "id": "test_connection",
-                "method": "initialize",
-                "params": {"protocolVersion": "2024-11-05", "capabilities": {}},
-            }
+        self.session = self._create_session()
 
-            logger.info(f"Sending test request to: {self.url}")
-            logger.info(f"Headers: {self.headers}")
+        logger.info(f"HTTPTransport initialized with URL: {self.url}")
 
-            response = self.session.post(
-                self.url, json=test_message, headers={**self.headers, "Content-Type": "application/json"}, timeout=self.timeout
+    def _create_session(self):
+        """Build the pooled HTTP client used for every POST"""
+        # Headers live on the session, so POSTs carry no per-request header mapping to merge
+        post_headers = {**self.headers, "Content-Type": "application/json"}
+        if httpx is not None:
+            # httpx does not follow redirects by default, unlike requests
+            return httpx.Client(
+                http2=True,
+                headers=post_headers,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                follow_redirects=True,
             )
 
-            logger.info(f"Response status code: {response.status_code}")
-            logger.info(f"Response headers: {dict(response.headers)}")
-
-            if response.status_code == 200:
-                result = response.json()
-                logger.info(f"Response body: {result}")
-                if result.get("jsonrpc") == "2.0" and "result" in result:
-                    self.connected = True
-                    logger.info(f"Connected to MCP server via HTTP: {self.url}")
-                    return
+        session = requests.Session()
+        session.headers.update(post_headers)
+        return session
 
-            logger.error(f"HTTP server returned status {response.status_code}")
-            logger.error(f"Response text: {response.text}")
-            raise RuntimeError(f"HTTP server returned status {response.status_code} or invalid MCP response")
+    def connect(self) -> None:
+        """Mark the HTTP transport ready; connection errors surface on the first request"""
+        # A closed httpx client cannot be reused, so reconnecting after disconnect needs a fresh one
+        if httpx is not None and self.session.is_closed:
+            self.session = self._create_session()
 
-        except Exception as e:
-            logger.error(f"Failed to connect via HTTP to {self.url}: {e}")
-            raise
+        # HTTP is stateless and MCPClient.initialize performs the real handshake,
+        # so sending a separate probe request here would only double the round-trips
+        self.connected = True
+        logger.info(f"HTTPTransport ready for MCP server at: {self.url}")
 
     def disconnect(self) -> None:
         """Close HTTP session"""
@@ -210,15 +323,14 @@ class HTTPTransport(MCPTransport):
             raise RuntimeError("Not connected to MCP server")
 
         try:
-            response = self.session.post(
-                self.url, json=message, headers={**self.headers, "Content-Type": "application/json"}, timeout=self.timeout
-            )
+            response = self._post(orjson.dumps(message))
 
             response.raise_for_status()
-            result = response.json()
+            # Parse the body bytes directly instead of decoding to str first
+            result = orjson.loads(response.content)
 
-            logger.debug(f"Sent message via HTTP: {message}")
-            logger.debug(f"Received response via HTTP: {result}")
+            logger.debug("Sent message via HTTP: %s", message)
+            logger.debug("Received response via HTTP: %s", result)
 
             return result  # Sync transport - return response directly
 
@@ -226,6 +338,13 @@ class HTTPTransport(MCPTransport):
             logger.error(f"Failed to send message via HTTP: {e}")
             raise
 
+    def _post(self, body: bytes):
+        """POST an encoded JSON body with whichever HTTP client is in use"""
+        if httpx is not None:
+            return self.session.post(self.url, content=body, timeout=self.timeout)
+
+        return self.session.post(self.url, data=body, timeout=self.timeout)
+
 
 class WebSocketTransport(MCPTransport):
     """WebSocket transport for MCP"""
@@ -236,7 +355,6 @@ class WebSocketTransport(MCPTransport):
         self.protocols = protocols or []
         self.headers = headers or {}
         self.websocket: Optional[websocket.WebSocket] = None
-        self.reader_thread: Optional[threading.Thread] = None
         self.running = False
 
     def connect(self) -> None:
@@ -250,9 +368,9 @@ class WebSocketTransport(MCPTransport):
             self.running = True
             self.connected = True
 
-            # Start reader thread
-            self.reader_thread = threading.Thread(target=self._read_messages, daemon=True)
-            self.reader_thread.start()
+            # recv_data blocks until a whole frame arrives (up to the 30 s socket timeout), so a slow
+            # peer must not share the reactor thread that serves every stdio transport
+            reactor.register(self.websocket.sock, self._read_frame, dedicated=True)
 
             logger.info(f"Connected to MCP server via WebSocket: {self.url}")
 
@@ -266,6 +384,8 @@ class WebSocketTransport(MCPTransport):
         self.connected = False
 
         if self.websocket:
+            reactor.unregister(self.websocket.sock)
+
             try:
                 self.websocket.close()
             except Exception as e:
@@ -273,9 +393,6 @@ class WebSocketTransport(MCPTransport):
 
             self.websocket = None
 
-        if self.reader_thread and self.reader_thread.is_alive():
-            self.reader_thread.join(timeout=1)
-
         logger.info("Disconnected from MCP server via WebSocket")
 
     def send_message(self, message: Dict[str, Any]) -> None:
@@ -284,38 +401,59 @@ class WebSocketTransport(MCPTransport):
             raise RuntimeError("Not connected to MCP server")
 
         try:
-            json_message = json.dumps(message)
-            self.websocket.send(json_message)
+            # orjson emits UTF-8 bytes, which go out unchanged as a text frame
+            self.websocket.send(orjson.dumps(message))
 
-            logger.debug(f"Sent message via WebSocket: {message}")
+            logger.debug("Sent message via WebSocket: %s", message)
             return None  # Async transport - response comes via message handler
 
         except Exception as e:
             logger.error(f"Failed to send message via WebSocket: {e}")
             raise
 
-    def _read_messages(self) -> None:
-        """Read messages from WebSocket in separate thread"""
-        while self.running and self.websocket:
-            try:
-                message_str = self.websocket.recv()
-                if message_str:
-                    try:
-                        message = json.loads(message_str)
-                        if self.message_handler:
-                            self.message_handler(message)
+    def _read_frame(self, sock) -> None:
+        """Read one frame from the WebSocket (called in a loop on this transport's reader thread)"""
+        ws = self.websocket
+        if not ws:
+            reactor.unregister(sock)
+            return
 
-                        logger.debug(f"Received message via WebSocket: {message}")
+        try:
+            # control_frame=True returns pings/pongs instead of blocking for the next data frame
+            opcode, data = ws.recv_data(control_frame=True)
+        except websocket.WebSocketTimeoutException:
+            # An idle server is not an error; partial frames stay buffered for the next call
+            return
+        except websocket.WebSocketConnectionClosedException:
+            logger.info("WebSocket connection closed")
+            self._close_from_reader(sock)
+            return
+        except Exception as e:
+            if self.running:
+                logger.error(f"Error reading from WebSocket: {e}")
+            self._close_from_reader(sock)
+            return
+
+        if opcode == websocket.ABNF.OPCODE_CLOSE:
+            logger.info("WebSocket connection closed")
+            self._close_from_reader(sock)
+        elif opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY) and data:
+            self._handle_frame(data)
+
+    def _handle_frame(self, data: bytes) -> None:
+        """Decode a single data frame and pass it to the message handler"""
+        try:
+            # Parse the raw frame bytes directly; no intermediate str decode
+            message = orjson.loads(data)
+            if self.message_handler:
+                handler_pool.submit(self.message_handler, message)
 
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Invalid JSON received via WebSocket: {message_str}, error: {e}")
+            logger.debug("Received message via WebSocket: %s", message)
 
-            except websocket.WebSocketConnectionClosedException:
-                logger.info("WebSocket connection closed")
-                break
-            except Exception as e:
-                if self.running:
-                    logger.error(f"Error reading from WebSocket: {e}")
-                break
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Invalid JSON received via WebSocket: {data}, error: {e}")
 
+    def _close_from_reader(self, sock) -> None:
+        """Stop watching a socket the server has closed"""
+        reactor.unregister(sock)
         self.connected = False
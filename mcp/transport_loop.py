@@ -0,0 +1,132 @@
+"""
+Shared selector-based event loop for MCP transports
+"""
+import logging
+import os
+import selectors
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Reactor:
+    """Multiplexes the input of every async transport onto a single reader thread"""
+
+    def __init__(self, select_timeout: float = 0.5, selector: Optional[selectors.BaseSelector] = None):
+        self.select_timeout = select_timeout
+        self.selector = selector or selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        # Files the selector cannot poll (e.g. pipes on Windows) and dedicated readers get a thread each
+        self.fallback_threads: Dict[Any, threading.Thread] = {}
+
+    def register(self, fileobj: Any, callback: Callable[[Any], None], dedicated: bool = False) -> None:
+        """Call callback(fileobj) whenever fileobj is readable
+
+        With dedicated=True, or for files the selector cannot poll, callback runs in a loop on a
+        thread of its own and may block; otherwise it runs on the shared reactor thread and must not.
+        """
+        with self.lock:
+            if dedicated or self._cannot_poll(fileobj):
+                self._start_blocking_reader(fileobj, callback)
+                return
+
+            try:
+                self.selector.register(fileobj, selectors.EVENT_READ, callback)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Selector cannot poll {fileobj!r} ({e}), using a blocking reader thread")
+                self._start_blocking_reader(fileobj, callback)
+                return
+
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self._run, name="mcp-reactor", daemon=True)
+                self.thread.start()
+
+    def _cannot_poll(self, fileobj: Any) -> bool:
+        """Whether fileobj would only fail later, inside select(), rather than at registration"""
+        # select() on Windows only handles sockets, yet SelectSelector.register accepts any file
+        return isinstance(self.selector, selectors.SelectSelector) and not isinstance(fileobj, socket.socket)
+
+    def _start_blocking_reader(self, fileobj: Any, callback: Callable[[Any], None]) -> None:
+        """Give fileobj a reader thread of its own; the caller holds the lock"""
+        thread = threading.Thread(target=self._run_blocking, args=(fileobj, callback), daemon=True)
+        self.fallback_threads[fileobj] = thread
+        thread.start()
+
+    def unregister(self, fileobj: Any) -> None:
+        """Stop watching fileobj; safe to call more than once"""
+        with self.lock:
+            if self.fallback_threads.pop(fileobj, None) is not None:
+                return
+
+            try:
+                self.selector.unregister(fileobj)
+            except (KeyError, ValueError):
+                pass
+
+    def _run(self) -> None:
+        """Dispatch readiness events until no files are left to watch"""
+        lock = self.lock
+        selector_map = self.selector.get_map()
+        select = self.selector.select
+        timeout = self.select_timeout
+        while True:
+            with lock:
+                if not selector_map:
+                    self.running = False
+                    return
+
+            try:
+                events = select(timeout=timeout)
+            except (OSError, ValueError) as e:
+                # Typically a file closed without being unregistered; drop it and keep serving the rest
+                if self._drop_closed_files():
+                    logger.warning(f"Dropped closed files from the transport reactor after: {e}")
+                    continue
+
+                logger.error(f"Transport reactor stopped, select failed: {e}")
+                with lock:
+                    self.running = False
+                return
+
+            for key, _ in events:
+                try:
+                    key.data(key.fileobj)
+                except Exception as e:
+                    logger.error(f"Error in transport read callback: {e}")
+
+    def _drop_closed_files(self) -> bool:
+        """Unregister files whose descriptors are no longer open; returns True if any were dropped"""
+        dropped = False
+        with self.lock:
+            for key in list(self.selector.get_map().values()):
+                try:
+                    os.fstat(key.fd)
+                except OSError:
+                    try:
+                        self.selector.unregister(key.fileobj)
+                    except (KeyError, ValueError):
+                        pass
+                    dropped = True
+        return dropped
+
+    def _run_blocking(self, fileobj: Any, callback: Callable[[Any], None]) -> None:
+        """Reader loop for a single file on its own thread, until it is unregistered"""
+        while fileobj in self.fallback_threads:
+            try:
+                callback(fileobj)
+            except Exception as e:
+                logger.error(f"Error in transport read callback: {e}")
+                break
+
+
+reactor = Reactor()
+
+# Message handlers run here so slow handling never stalls reads for other transports.
+# Handlers must be thread-safe and must not rely on messages being handled in arrival order.
+handler_pool = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4), thread_name_prefix="mcp-handler")
@@ -0,0 +1,19 @@
+"""
+Deterministic data builders for performance tests
+"""
+import random
+import string
+
+from chat.service import ChatMessage, ChatSession
+
+ROLES = ("user", "assistant", "system")
+
+
+def make_session(n, seed=0):
+    """Build a session of n messages whose roles and contents depend only on seed"""
+    rng = random.Random(seed)
+    session = ChatSession(session_id=f"perf-session-{seed}", title="Benchmark")
+    for i in range(n):
+        content = "".join(rng.choices(string.ascii_letters, k=rng.randint(1, 200)))
+        session.add_message(ChatMessage(rng.choice(ROLES), content, message_id=f"m{i}"))
+    return session
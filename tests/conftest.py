@@ -3,3 +3,8 @@ import sys
 
 # Add the parent directory to the path so we can import the app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def pytest_configure(config):
+    # pytest.ini uses a setup.cfg-style section header, so its marker list is not picked up
+    config.addinivalue_line("markers", "slow: marks tests as slow (deselect with '-m \"not slow\"')")
@@ -1,14 +1,62 @@
 """
 Tests for chat functionality
 """
+import gc
+import weakref
 from datetime import datetime
-from unittest.mock import MagicMock, patch
+from unittest.mock import Mock, patch
 
 import pytest
 
 from chat.service import ChatMessage, ChatService, ChatSession
 
 
+class StubMCPClient:
+    """Minimal stand-in for MCPClient exposing only what ChatService uses"""
+
+    def __init__(self, tools=None, result=None):
+        self.tools = tools or []
+        self.result = result
+        self.calls = []
+        self.list_count = 0
+        self.tools_version = 0
+
+    def list_tools(self):
+        self.list_count += 1
+        return {"tools": self.tools}
+
+    def call_tool(self, name, arguments):
+        self.calls.append((name, arguments))
+        return self.result
+
+
+def _make_msg_dict(**overrides):
+    """Build a serialized ChatMessage dict, overriding any of its fields"""
+    return {
+        "id": "m",
+        "role": "user",
+        "content": "x",
+        "timestamp": "2023-01-01T12:00:00",
+        "tool_calls": [],
+        "tool_results": [],
+        **overrides,
+    }
+
+
+@pytest.fixture
+def service():
+    """Create a chat service without an API key"""
+    # Function-scoped: tests mutate sessions and MCP clients, so each needs its own instance
+    return ChatService()
+
+
+@pytest.fixture
+def service_with_session(service):
+    """Create a chat service holding a single session"""
+    session = service.create_session("Test Chat")
+    return service, session
+
+
 class TestChatMessage:
     """Test ChatMessage functionality"""
 
@@ -31,28 +79,28 @@ class TestChatMessage:
         assert message.id == "test-id"
         assert message.timestamp == custom_time
 
-    def test_chat_message_to_dict(self):
-        """Test converting chat message to dictionary"""
-        message = ChatMessage("user", "Test message")
+    @pytest.mark.parametrize(
+        "role,content",
+        [("user", "Test message"), ("assistant", "Test response"), ("system", "System message")],
+    )
+    def test_chat_message_dict_roundtrip(self, role, content):
+        """Test converting chat message to dictionary and back"""
+        message = ChatMessage(role, content)
         message_dict = message.to_dict()
 
-        assert message_dict["role"] == "user"
-        assert message_dict["content"] == "Test message"
+        assert message_dict["role"] == role
+        assert message_dict["content"] == content
         assert message_dict["id"] == message.id
         assert "timestamp" in message_dict
         assert message_dict["tool_calls"] == []
         assert message_dict["tool_results"] == []
 
+        restored = ChatMessage.from_dict(message_dict)
+        assert restored.to_dict() == message_dict
+
     def test_chat_message_from_dict(self):
         """Test creating chat message from dictionary"""
-        data = {
-            "id": "test-id",
-            "role": "assistant",
-            "content": "Test response",
-            "timestamp": "2023-01-01T12:00:00",
-            "tool_calls": [],
-            "tool_results": [],
-        }
+        data = _make_msg_dict(id="test-id", role="assistant", content="Test response")
 
         message = ChatMessage.from_dict(data)
 
@@ -94,6 +142,20 @@ class TestChatSession:
         assert session.messages[0] == message
         assert session.updated_at > original_updated_at
 
+    def test_updated_ns_tracks_updated_at(self):
+        """Test the read-only updated_ns sort key follows updated_at"""
+        session = ChatSession()
+
+        session.updated_at = datetime(2024, 1, 1, 12, 0, 0, 500000)
+        assert session.updated_ns == int(session.updated_at.timestamp() * 1_000_000) * 1000
+
+        updated_ns = session.updated_ns
+        session.add_message(ChatMessage("user", "Hello!"))
+        assert session.updated_ns > updated_ns
+
+        with pytest.raises(AttributeError):
+            session.updated_ns = 0
+
     def test_get_messages_for_claude(self):
         """Test getting messages in Claude API format"""
         session = ChatSession()
@@ -130,16 +192,7 @@ class TestChatSession:
             "created_at": "2023-01-01T12:00:00",
             "updated_at": "2023-01-01T13:00:00",
             "active_server_ids": ["server1"],
-            "messages": [
-                {
-                    "id": "msg1",
-                    "role": "user",
-                    "content": "Hello",
-                    "timestamp": "2023-01-01T12:30:00",
-                    "tool_calls": [],
-                    "tool_results": [],
-                }
-            ],
+            "messages": [_make_msg_dict(id="msg1", content="Hello", timestamp="2023-01-01T12:30:00")],
         }
 
         session = ChatSession.from_dict(data)
@@ -180,99 +233,74 @@ class TestChatService:
                 assert service.api_key == "direct-key"
                 mock_anthropic.assert_called_once_with(api_key="direct-key")
 
-    def test_set_mcp_clients(self):
+    def test_set_mcp_clients(self, service):
         """Test setting MCP clients reference"""
-        service = ChatService()
-        mock_clients = {"server1": MagicMock(), "server2": MagicMock()}
+        clients = {"server1": StubMCPClient(), "server2": StubMCPClient()}
 
-        service.set_mcp_clients(mock_clients)
+        service.set_mcp_clients(clients)
 
-        assert service.mcp_clients == mock_clients
+        assert service.mcp_clients == clients
 
-    def test_create_session(self):
+    def test_create_session(self, service):
         """Test creating a new chat session"""
-        service = ChatService()
-
         session = service.create_session("Test Chat")
 
         assert session.title == "Test Chat"
         assert session.id in service.sessions
         assert service.sessions[session.id] == session
 
-    def test_get_session(self):
-        """Test getting a chat session"""
-        service = ChatService()
-        session = service.create_session("Test Chat")
-
-        retrieved_session = service.get_session(session.id)
+    @pytest.mark.parametrize("existing", [True, False])
+    def test_get_session(self, service_with_session, existing):
+        """Test getting an existing and a non-existent chat session"""
+        service, session = service_with_session
+        session_id = session.id if existing else "nonexistent"
 
-        assert retrieved_session == session
-
-    def test_get_nonexistent_session(self):
-        """Test getting a non-existent session"""
-        service = ChatService()
+        retrieved_session = service.get_session(session_id)
 
-        result = service.get_session("nonexistent")
+        assert retrieved_session is (session if existing else None)
 
-        assert result is None
-
-    def test_list_sessions(self):
+    def test_list_sessions(self, service):
         """Test listing chat sessions"""
-        service = ChatService()
         session1 = service.create_session("Chat 1")
         session2 = service.create_session("Chat 2")
+        session1.add_message(ChatMessage("user", "Hello"))
 
         sessions_list = service.list_sessions()
 
-        assert len(sessions_list) == 2
-        session_ids = [s["id"] for s in sessions_list]
-        assert session1.id in session_ids
-        assert session2.id in session_ids
+        assert [s["id"] for s in sessions_list] == [session1.id, session2.id]
+        assert sessions_list[0]["message_count"] == 1
 
-    def test_delete_session(self):
-        """Test deleting a chat session"""
-        service = ChatService()
-        session = service.create_session("Test Chat")
+    @pytest.mark.parametrize("existing", [True, False])
+    def test_delete_session(self, service_with_session, existing):
+        """Test deleting an existing and a non-existent chat session"""
+        service, session = service_with_session
+        session_id = session.id if existing else "nonexistent"
 
-        success = service.delete_session(session.id)
+        success = service.delete_session(session_id)
 
-        assert success is True
-        assert session.id not in service.sessions
+        assert success is existing
+        assert (session.id in service.sessions) is not existing
 
-    def test_delete_nonexistent_session(self):
-        """Test deleting a non-existent session"""
-        service = ChatService()
-
-        success = service.delete_session("nonexistent")
-
-        assert success is False
-
-    def test_get_available_tools_no_servers(self):
+    def test_get_available_tools_no_servers(self, service):
         """Test getting available tools with no servers"""
-        service = ChatService()
-
         tools_info = service.get_available_tools([])
 
         assert tools_info["available_tools"] == {}
         assert tools_info["claude_tool_schemas"] == []
 
-    def test_get_available_tools_with_servers(self):
+    def test_get_available_tools_with_servers(self, service):
         """Test getting available tools with connected servers"""
-        service = ChatService()
-
-        # Mock MCP client
-        mock_client = MagicMock()
-        mock_client.list_tools.return_value = {
-            "tools": [
+        stub_client = StubMCPClient(
+            tools=[
                 {
                     "name": "test_tool",
                     "description": "A test tool",
                     "inputSchema": {"type": "object", "properties": {"param": {"type": "string"}}},
                 }
             ]
-        }
+        )
 
-        service.set_mcp_clients({"server1": mock_client})
+        service.set_mcp_clients({"server1": stub_client})
 
         tools_info = service.get_available_tools(["server1"])
 
@@ -283,10 +311,87 @@ class TestChatService:
         assert claude_tool["name"] == "server1_test_tool"
         assert claude_tool["description"] == "A test tool"
 
-    def test_convert_mcp_tool_to_claude_function(self):
-        """Test converting MCP tool to Claude function format"""
-        service = ChatService()
+    def test_get_available_tools_is_cached_per_client(self, service):
+        """Test tool listings are reused until the client for a server changes"""
+        first = StubMCPClient(tools=[{"name": "test_tool"}])
+        clients = {"server1": first}
+        service.set_mcp_clients(clients)
+
+        assert service.get_available_tools(["server1"]) == service.get_available_tools(["server1"])
+        assert first.list_count == 1
+
+        clients["server1"] = second = StubMCPClient(tools=[{"name": "other_tool"}])
+        tools_info = service.get_available_tools(["server1"])
+
+        assert second.list_count == 1
+        assert tools_info["claude_tool_schemas"][0]["name"] == "server1_other_tool"
+
+    def test_get_available_tools_keeps_caller_order(self, service):
+        """Test cached listings are assembled in each caller's server order"""
+        clients = {name: StubMCPClient(tools=[{"name": f"{name}_tool"}]) for name in ("a", "b")}
+        service.set_mcp_clients(clients)
+
+        first = service.get_available_tools(["b", "a"])
+        second = service.get_available_tools(["a", "b"])
+
+        assert [tool["name"] for tool in first["claude_tool_schemas"]] == ["b_b_tool", "a_a_tool"]
+        assert [tool["name"] for tool in second["claude_tool_schemas"]] == ["a_a_tool", "b_b_tool"]
+        assert list(second["available_tools"]) == ["a", "b"]
+        assert clients["a"].list_count == clients["b"].list_count == 1
+
+    def test_get_available_tools_caches_per_server(self, service):
+        """Test a failing server is retried without relisting servers that succeeded"""
+        good = StubMCPClient(tools=[{"name": "test_tool"}])
+        bad = StubMCPClient()
+        bad.list_tools = Mock(side_effect=RuntimeError("server down"))
+        service.set_mcp_clients({"good": good, "bad": bad})
+
+        service.get_available_tools(["good", "bad"])
+        tools_info = service.get_available_tools(["good", "bad"])
+
+        assert good.list_count == 1
+        assert bad.list_tools.call_count == 2
+        assert list(tools_info["available_tools"]) == ["good"]
+
+    def test_get_available_tools_expires(self, service, monkeypatch):
+        """Test listings are refetched after the TTL, for servers that never send list_changed"""
+        monkeypatch.setattr("chat.service.TOOLS_CACHE_TTL", 0)
+        client = StubMCPClient(tools=[{"name": "test_tool"}])
+        service.set_mcp_clients({"server1": client})
+
+        service.get_available_tools(["server1"])
+        service.get_available_tools(["server1"])
+
+        assert client.list_count == 2
 
+    def test_get_available_tools_refreshes_after_list_changed(self, service):
+        """Test a tool list change notification invalidates the cached listing"""
+        client = StubMCPClient(tools=[{"name": "test_tool"}])
+        service.set_mcp_clients({"server1": client})
+        service.get_available_tools(["server1"])
+
+        client.tools = [{"name": "new_tool"}]
+        client.tools_version += 1
+        tools_info = service.get_available_tools(["server1"])
+
+        assert client.list_count == 2
+        assert tools_info["claude_tool_schemas"][0]["name"] == "server1_new_tool"
+
+    def test_tools_cache_does_not_keep_disconnected_clients_alive(self, service):
+        """Test a client removed from the app can be garbage collected despite a cached listing"""
+        clients = {"server1": StubMCPClient(tools=[{"name": "test_tool"}])}
+        service.set_mcp_clients(clients)
+        service.get_available_tools(["server1"])
+        client_ref = weakref.ref(clients["server1"])
+
+        del clients["server1"]
+        gc.collect()
+
+        assert client_ref() is None
+        assert service.get_available_tools(["server1"])["available_tools"] == {}
+
+    def test_convert_mcp_tool_to_claude_function(self, service):
+        """Test converting MCP tool to Claude function format"""
         mcp_tool = {
             "name": "test_tool",
             "description": "A test tool",
@@ -299,10 +404,10 @@ class TestChatService:
         assert claude_function["description"] == "A test tool"
         assert "_mcp_server_id" in claude_function["input_schema"]["properties"]
         assert claude_function["input_schema"]["properties"]["_mcp_server_id"]["const"] == "server1"
+        assert "_mcp_server_id" not in mcp_tool["inputSchema"]["properties"]
 
-    def test_send_message_without_api_key(self):
+    def test_send_message_without_api_key(self, service):
         """Test sending message without API key configured"""
-        service = ChatService()
         session = service.create_session("Test")
 
         with pytest.raises(ValueError, match="Anthropic API key not configured"):
@@ -317,9 +422,8 @@ class TestChatService:
                 with pytest.raises(ValueError, match="Session .* not found"):
                     service.send_message("nonexistent", "Hello")
 
-    def test_get_session_summary(self):
+    def test_get_session_summary(self, service):
         """Test getting session summary"""
-        service = ChatService()
         session = service.create_session("Test Chat")
         session.add_message(ChatMessage("user", "Hello"))
         session.active_server_ids = ["server1"]
@@ -333,39 +437,29 @@ class TestChatService:
         assert summary["active_servers"] == ["server1"]
         assert summary["last_message"] == "Hello"
 
-    def test_get_session_summary_nonexistent(self):
+    def test_get_session_summary_nonexistent(self, service):
         """Test getting summary for non-existent session"""
-        service = ChatService()
-
         summary = service.get_session_summary("nonexistent")
 
         assert summary is None
 
-    def test_execute_mcp_tool(self):
+    def test_execute_mcp_tool(self, service):
         """Test executing an MCP tool"""
-        service = ChatService()
-
-        # Mock MCP client
-        mock_client = MagicMock()
-        mock_client.call_tool.return_value = {"result": "success"}
+        stub_client = StubMCPClient(result={"result": "success"})
 
-        service.set_mcp_clients({"server1": mock_client})
+        service.set_mcp_clients({"server1": stub_client})
 
         result = service._execute_mcp_tool("server1_test_tool", {"param": "value", "_mcp_server_id": "server1"})
 
-        mock_client.call_tool.assert_called_once_with("test_tool", {"param": "value"})
+        assert stub_client.calls == [("test_tool", {"param": "value"})]
         assert result == {"result": "success"}
 
-    def test_execute_mcp_tool_invalid_format(self):
+    def test_execute_mcp_tool_invalid_format(self, service):
         """Test executing MCP tool with invalid name format"""
-        service = ChatService()
-
         with pytest.raises(ValueError, match="Invalid tool name format"):
             service._execute_mcp_tool("invalidtoolname", {})
 
-    def test_execute_mcp_tool_server_not_connected(self):
+    def test_execute_mcp_tool_server_not_connected(self, service):
         """Test executing MCP tool with server not connected"""
-        service = ChatService()
-
         with pytest.raises(ValueError, match="MCP server .* not connected"):
             service._execute_mcp_tool("server1_test_tool", {})
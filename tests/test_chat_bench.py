@@ -0,0 +1,59 @@
+"""
+Benchmarks for chat service hot paths
+"""
+import pytest
+
+from chat.service import ChatService, ChatSession
+from tests._perf_helpers import make_session
+
+# Benchmarks need the pytest-benchmark plugin from requirements-dev.txt and are skipped without it
+pytest.importorskip("pytest_benchmark")
+
+pytestmark = pytest.mark.slow
+
+
+def _tools(count):
+    return [
+        {
+            "name": f"tool_{i}",
+            "description": f"Tool number {i}",
+            "inputSchema": {"type": "object", "properties": {"param": {"type": "string"}}},
+        }
+        for i in range(count)
+    ]
+
+
+def test_session_to_dict_bench(benchmark):
+    session = make_session(10_000)
+
+    data = benchmark(session.to_dict)
+
+    assert len(data["messages"]) == 10_000
+
+
+def test_session_from_dict_bench(benchmark):
+    data = make_session(10_000).to_dict()
+
+    session = benchmark(ChatSession.from_dict, data)
+
+    assert session.to_dict() == data
+
+
+def test_get_messages_for_claude_bench(benchmark):
+    session = make_session(10_000)
+
+    messages = benchmark(session.get_messages_for_claude)
+
+    assert all(message["role"] in ("user", "assistant") for message in messages)
+
+
+def test_convert_tools_bench(benchmark):
+    service = ChatService()
+    tools = _tools(1_000)
+
+    def convert():
+        return [service._convert_mcp_tool_to_claude_function(tool, "server1") for tool in tools]
+
+    schemas = benchmark(convert)
+
+    assert len(schemas) == 1_000
@@ -0,0 +1,153 @@
+"""
+Tests for the MCP client
+"""
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from mcp.client import MCPClient
+from mcp.protocol import MCPError, MessageType, validate_message
+from mcp.transport import MCPTransport
+
+
+class FakeTransport(MCPTransport):
+    """In-memory async transport; replies are delivered through the message handler like stdio"""
+
+    def __init__(self, reply=None):
+        super().__init__()
+        self.reply = reply
+        self.sent = []
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def send_message(self, message):
+        self.sent.append(message)
+        if self.reply is not None and "id" in message:
+            # Answer before send_message returns, as a fast server on the reader thread can
+            self.message_handler(self.reply(message))
+        return None
+
+
+def echo_result(message):
+    return {"jsonrpc": "2.0", "id": message["id"], "result": {"method": message["method"]}}
+
+
+class TestValidateMessage:
+    """Test message validation and classification"""
+
+    @pytest.mark.parametrize(
+        "message, expected",
+        [
+            ({"jsonrpc": "2.0", "id": "1", "method": "tools/list"}, MessageType.REQUEST),
+            ({"jsonrpc": "2.0", "id": None, "method": "tools/list", "params": {}}, MessageType.REQUEST),
+            ({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}, MessageType.NOTIFICATION),
+            ({"jsonrpc": "2.0", "id": "1", "result": {}}, MessageType.RESPONSE),
+            ({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}, MessageType.RESPONSE),
+        ],
+    )
+    def test_message_type(self, message, expected):
+        """Test each valid message is classified by its shape; an explicit null id still marks a request"""
+        assert validate_message(message) is expected
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            [],
+            {"jsonrpc": "1.0", "id": "1", "method": "ping"},
+            {"jsonrpc": "2.0", "id": "1", "method": 1},
+            {"jsonrpc": "2.0", "id": "1", "method": "ping", "params": []},
+            {"jsonrpc": "2.0", "result": {}},
+            {"jsonrpc": "2.0", "id": "1", "result": {}, "error": {}},
+            {"jsonrpc": "2.0", "id": "1"},
+        ],
+    )
+    def test_invalid_message(self, message):
+        """Test malformed messages are rejected"""
+        with pytest.raises(MCPError):
+            validate_message(message)
+
+
+class TestHandleMessage:
+    """Test dispatch of incoming messages"""
+
+    def test_response_wakes_pending_request(self):
+        """Test a response is stored for and signals its waiting request"""
+        client = MCPClient(FakeTransport())
+        event = client.pending_requests["1"] = threading.Event()
+        response = {"jsonrpc": "2.0", "id": "1", "result": {}}
+
+        client._handle_message(response)
+
+        assert event.is_set()
+        assert client.request_responses["1"] is response
+
+    def test_unknown_response_is_ignored(self):
+        """Test a response nobody is waiting for is not stored"""
+        client = MCPClient(FakeTransport())
+
+        client._handle_message({"jsonrpc": "2.0", "id": "stale", "result": {}})
+
+        assert client.request_responses == {}
+
+    def test_notification_is_dispatched(self):
+        """Test notifications go to their handler and are never answered"""
+        transport = FakeTransport()
+        client = MCPClient(transport)
+        client._handle_logging_notification = Mock()
+
+        client._handle_message({"jsonrpc": "2.0", "method": "logging", "params": {"message": "hi"}})
+
+        client._handle_logging_notification.assert_called_once_with({"message": "hi"})
+        assert transport.sent == []
+
+    def test_server_request_gets_method_not_found(self):
+        """Test requests from the server, including a null id, are answered with an error"""
+        transport = FakeTransport()
+        client = MCPClient(transport)
+
+        client._handle_message({"jsonrpc": "2.0", "id": None, "method": "sampling/createMessage"})
+
+        assert len(transport.sent) == 1
+        assert transport.sent[0]["id"] is None
+        assert transport.sent[0]["error"]["code"] == MCPError.METHOD_NOT_FOUND
+
+    def test_invalid_message_is_dropped(self):
+        """Test a malformed message is logged rather than raised on the reader thread"""
+        transport = FakeTransport()
+        client = MCPClient(transport)
+
+        client._handle_message({"jsonrpc": "1.0", "id": "1", "result": {}})
+
+        assert transport.sent == []
+        assert client.request_responses == {}
+
+
+class TestSendRequest:
+    """Test request/response matching"""
+
+    def test_reply_before_send_returns_is_not_lost(self):
+        """Test the waiter is registered before the request goes out"""
+        client = MCPClient(FakeTransport(reply=echo_result))
+
+        response = client._send_request("ping", {}, timeout=1)
+
+        assert response["result"] == {"method": "ping"}
+        assert client.pending_requests == {}
+        assert client.request_responses == {}
+
+
+class TestNotifications:
+    """Test server notifications"""
+
+    def test_tools_list_changed_bumps_tools_version(self):
+        """Test the tool list change notification marks cached listings stale"""
+        client = MCPClient(FakeTransport())
+
+        client._handle_message({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+
+        assert client.tools_version == 1
@@ -1,6 +1,7 @@
 import json
 import os
-import tempfile
+import threading
+from datetime import datetime, timezone
 from unittest.mock import patch
 
 import pytest
@@ -63,6 +64,53 @@ class TestServerConfig:
         assert config.auto_connect is False  # Default value
 
 
+class TestServerConfigCreatedAt:
+    """Test the lazily parsed created_at timestamp"""
+
+    @staticmethod
+    def _load(created_at):
+        data = {"id": "test-id-123", "name": "Test Server", "transport_type": "http", "config": {}}
+        return ServerConfig.from_dict({**data, "created_at": created_at})
+
+    def test_unchanged_string_round_trips(self):
+        """Test a loaded timestamp is written back exactly as stored"""
+        config = self._load("2024-01-01T12:00:00.123456")
+
+        assert config.to_dict()["created_at"] == "2024-01-01T12:00:00.123456"
+
+        assert config.created_at == datetime(2024, 1, 1, 12, 0, 0, 123456)
+        assert config.to_dict()["created_at"] == "2024-01-01T12:00:00.123456"
+
+    def test_trailing_z_parses_as_utc(self):
+        """Test a Zulu suffix gives a timezone-aware datetime"""
+        config = self._load("2024-01-01T12:00:00Z")
+
+        assert config.created_at == datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        assert config.created_at.tzinfo is not None
+
+    def test_invalid_string_is_passed_through_until_read(self):
+        """Test an unparseable value is serialized verbatim until read, then replaced with now()"""
+        config = self._load("not a date")
+
+        assert config.to_dict()["created_at"] == "not a date"
+
+        before = datetime.now()
+        created_at = config.created_at
+
+        assert before <= created_at <= datetime.now()
+        assert config.to_dict()["created_at"] == created_at.isoformat()
+
+    def test_assigning_datetime_clears_stored_string(self):
+        """Test a new datetime replaces the loaded string in to_dict"""
+        config = self._load("2024-01-01T12:00:00")
+        new_time = datetime(2025, 6, 1, 8, 30)
+
+        config.created_at = new_time
+
+        assert config.created_at is new_time
+        assert config.to_dict()["created_at"] == "2025-06-01T08:30:00"
+
+
 class TestServerConfigManager:
     """Test cases for ServerConfigManager"""
 
@@ -71,63 +119,93 @@ class TestServerConfigManager:
         manager = ServerConfigManager("test_config.json")
         assert manager.config_file == "test_config.json"
 
-    def test_load_configs_nonexistent_file(self):
+    def test_load_configs_nonexistent_file(self, tmp_path):
         """Test loading configs when file doesn't exist"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            config_file = os.path.join(temp_dir, "nonexistent.json")
-            manager = ServerConfigManager(config_file)
+        config_file = str(tmp_path / "nonexistent.json")
+        manager = ServerConfigManager(config_file)
 
-            configs = manager.load_configs()
-            assert configs == {}
+        configs = manager.load_configs()
+        assert configs == {}
 
-    def test_save_and_load_configs(self):
+    def test_save_and_load_configs(self, tmp_path):
         """Test saving and loading server configurations"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            config_file = os.path.join(temp_dir, "test_config.json")
-            manager = ServerConfigManager(config_file)
-
-            # Create test server configs
-            config1 = ServerConfig(
-                name="Server 1",
-                transport_type="http",
-                config={"url": "http://example1.com"},
-                auto_connect=True,
-                server_id="server-1",
-            )
-            config2 = ServerConfig(
-                name="Server 2",
-                transport_type="stdio",
-                config={"command": "test-cmd"},
-                auto_connect=False,
-                server_id="server-2",
-            )
-
-            test_configs = {"server-1": config1, "server-2": config2}
-
-            # Save configs
-            result = manager.save_configs(test_configs)
-            assert result is True
-            assert os.path.exists(config_file)
-
-            # Load configs
-            loaded_configs = manager.load_configs()
-            assert len(loaded_configs) == 2
-            assert "server-1" in loaded_configs
-            assert "server-2" in loaded_configs
-
-            # Verify loaded config 1
-            loaded_config1 = loaded_configs["server-1"]
-            assert loaded_config1.name == "Server 1"
-            assert loaded_config1.transport_type == "http"
-            assert loaded_config1.auto_connect is True
-            assert loaded_config1.id == "server-1"
-
-            # Verify loaded config 2
-            loaded_config2 = loaded_configs["server-2"]
-            assert loaded_config2.name == "Server 2"
-            assert loaded_config2.transport_type == "stdio"
-            assert loaded_config2.auto_connect is False
-            assert loaded_config2.id == "server-2"
+        config_file = str(tmp_path / "test_config.json")
+        manager = ServerConfigManager(config_file)
+
+        # Create test server configs
+        config1 = ServerConfig(
+            name="Server 1",
+            transport_type="http",
+            config={"url": "http://example1.com"},
+            auto_connect=True,
+            server_id="server-1",
+        )
+        config2 = ServerConfig(
+            name="Server 2",
+            transport_type="stdio",
+            config={"command": "test-cmd"},
+            auto_connect=False,
+            server_id="server-2",
+        )
+
+        test_configs = {"server-1": config1, "server-2": config2}
+
+        # Save configs
+        result = manager.save_configs(test_configs)
+        assert result is True
+        assert os.path.exists(config_file)
+
+        # Load configs
+        loaded_configs = manager.load_configs()
+        assert len(loaded_configs) == 2
+        assert "server-1" in loaded_configs
+        assert "server-2" in loaded_configs
+
+        # Verify loaded config 1
+        loaded_config1 = loaded_configs["server-1"]
+        assert loaded_config1.name == "Server 1"
+        assert loaded_config1.transport_type == "http"
+        assert loaded_config1.auto_connect is True
+        assert loaded_config1.id == "server-1"
+
+        # Verify loaded config 2
+        loaded_config2 = loaded_configs["server-2"]
+        assert loaded_config2.name == "Server 2"
+        assert loaded_config2.transport_type == "stdio"
+        assert loaded_config2.auto_connect is False
+        assert loaded_config2.id == "server-2"
+
+    def test_concurrent_saves_do_not_collide(self, tmp_path):
+        """Test saves from two threads at once each succeed and leave one complete file"""
+        config_file = tmp_path / "test_config.json"
+        manager = ServerConfigManager(str(config_file))
+        variants = [
+            {
+                f"server-{name}-{i}": ServerConfig(name=f"{name} {i}", transport_type="http", config={"url": "x" * 2000})
+                for i in range(50)
+            }
+            for name in ("a", "b")
+        ]
+        results = []
+
+        for _ in range(20):
+            barrier = threading.Barrier(2)
+
+            def save(configs):
+                barrier.wait()
+                results.append(manager.save_configs(configs))
+
+            threads = [threading.Thread(target=save, args=(configs,)) for configs in variants]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            saved = json.loads(config_file.read_text())
+            assert set(saved) in [set(configs) for configs in variants]
+
+        assert all(results) and len(results) == 40
+        assert [path.name for path in tmp_path.iterdir()] == ["test_config.json"]
 
     def test_save_configs_invalid_file(self):
         """Test saving configs to invalid file path"""
@@ -138,88 +216,83 @@ class TestServerConfigManager:
         result = manager.save_configs({"test": config})
         assert result is False
 
-    def test_load_configs_corrupted_file(self):
+    def test_load_configs_corrupted_file(self, tmp_path):
         """Test loading from corrupted JSON file"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            config_file = os.path.join(temp_dir, "corrupted.json")
+        config_file = str(tmp_path / "corrupted.json")
 
-            # Create corrupted JSON file
-            with open(config_file, "w") as f:
-                f.write("{ invalid json")
+        # Create corrupted JSON file
+        with open(config_file, "w") as f:
+            f.write("{ invalid json")
 
-            manager = ServerConfigManager(config_file)
-            configs = manager.load_configs()
-            assert configs == {}
+        manager = ServerConfigManager(config_file)
+        configs = manager.load_configs()
+        assert configs == {}
 
-    def test_load_configs_with_invalid_server_data(self):
+    def test_load_configs_with_invalid_server_data(self, tmp_path):
         """Test loading configs with some invalid server data"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            config_file = os.path.join(temp_dir, "mixed_config.json")
-
-            # Create file with mixed valid/invalid data
-            data = {
-                "valid-server": {
-                    "id": "valid-server",
-                    "name": "Valid Server",
-                    "transport_type": "http",
-                    "config": {"url": "http://example.com"},
-                    "auto_connect": True,
-                },
-                "invalid-server": {
-                    "id": "invalid-server",
-                    "name": "Invalid Server"
-                    # Missing required fields
-                },
-            }
+        config_file = str(tmp_path / "mixed_config.json")
+
+        # Create file with mixed valid/invalid data
+        data = {
+            "valid-server": {
+                "id": "valid-server",
+                "name": "Valid Server",
+                "transport_type": "http",
+                "config": {"url": "http://example.com"},
+                "auto_connect": True,
+            },
+            "invalid-server": {
+                "id": "invalid-server",
+                "name": "Invalid Server"
+                # Missing required fields
+            },
+        }
 
-            with open(config_file, "w") as f:
-                json.dump(data, f)
+        with open(config_file, "w") as f:
+            json.dump(data, f)
 
-            manager = ServerConfigManager(config_file)
-            configs = manager.load_configs()
+        manager = ServerConfigManager(config_file)
+        configs = manager.load_configs()
 
-            # Should only load the valid server
-            assert len(configs) == 1
-            assert "valid-server" in configs
-            assert "invalid-server" not in configs
+        # Should only load the valid server
+        assert len(configs) == 1
+        assert "valid-server" in configs
+        assert "invalid-server" not in configs
 
-    def test_status_not_saved_to_file(self):
+    def test_status_not_saved_to_file(self, tmp_path):
         """Test that runtime status is not saved to persistent storage"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            config_file = os.path.join(temp_dir, "status_test.json")
-            manager = ServerConfigManager(config_file)
+        config_file = str(tmp_path / "status_test.json")
+        manager = ServerConfigManager(config_file)
 
-            # Create config with status
-            config = ServerConfig(
-                name="Test Server", transport_type="http", config={"url": "http://example.com"}, server_id="test-server"
-            )
-            config.status = "connected"  # Set runtime status
+        # Create config with status
+        config = ServerConfig(
+            name="Test Server", transport_type="http", config={"url": "http://example.com"}, server_id="test-server"
+        )
+        config.status = "connected"  # Set runtime status
 
-            # Save and reload
-            manager.save_configs({"test-server": config})
+        # Save and reload
+        manager.save_configs({"test-server": config})
 
-            # Check file content directly
-            with open(config_file, "r") as f:
-                saved_data = json.load(f)
+        # Check file content directly
+        with open(config_file, "r") as f:
+            saved_data = json.load(f)
 
-            assert "status" not in saved_data["test-server"]
+        assert "status" not in saved_data["test-server"]
 
-            # Load and verify status is reset to default
-            loaded_configs = manager.load_configs()
-            assert loaded_configs["test-server"].status == "disconnected"
+        # Load and verify status is reset to default
+        loaded_configs = manager.load_configs()
+        assert loaded_configs["test-server"].status == "disconnected"
 
 
 class TestPersistentStorageAPI:
     """Test API endpoints with persistent storage"""
 
-    @pytest.fixture
-    def client(self):
-        """Create a test client with temporary config file"""
+    @pytest.fixture(scope="class")
+    def client(self, tmp_path_factory):
+        """Create one test client for the class, backed by a temporary config file"""
         from app import app, config_manager
 
-        # Use a temporary file for testing
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            temp_config_file = f.name
+        temp_config_file = str(tmp_path_factory.mktemp("config") / "server_configs.json")
 
         # Patch the config manager to use temp file
         with patch.object(config_manager, "config_file", temp_config_file):
@@ -230,14 +303,22 @@ class TestPersistentStorageAPI:
                 with app.app_context():
                     yield client
 
-        # Cleanup
-        try:
-            os.unlink(temp_config_file)
-        except FileNotFoundError:
-            pass
+    @pytest.fixture(autouse=True)
+    def reset_server_configs(self, client):
+        """Undo each test's changes to the in-memory and on-disk server configurations"""
+        from app import config_manager, server_configs
+
+        snapshot = dict(server_configs)
+        yield
+        server_configs.clear()
+        server_configs.update(snapshot)
+        if os.path.exists(config_manager.config_file):
+            os.unlink(config_manager.config_file)
 
     def test_create_server_with_auto_connect(self, client):
         """Test creating server with auto_connect option"""
+        from app import config_manager
+
         server_data = {
             "name": "Auto Connect Server",
             "transport_type": "http",
@@ -251,24 +332,46 @@ class TestPersistentStorageAPI:
         data = response.get_json()
         assert data["auto_connect"] is True
         assert data["name"] == "Auto Connect Server"
+        assert config_manager.load_configs()[data["id"]].auto_connect is True
 
     def test_update_server_auto_connect(self, client):
         """Test updating server auto_connect setting"""
-        # First create a server
-        server_data = {
-            "name": "Test Server",
-            "transport_type": "http",
-            "config": {"url": "http://example.com"},
-            "auto_connect": False,
-        }
+        from app import config_manager, server_configs
 
-        create_response = client.post("/api/servers", json=server_data, content_type="application/json")
-        server_id = create_response.get_json()["id"]
+        # Seed the server directly; creation over HTTP is covered above
+        config = ServerConfig(name="Test Server", transport_type="http", config={"url": "http://example.com"})
+        server_configs[config.id] = config
 
         # Update auto_connect setting
         update_data = {"auto_connect": True}
-        response = client.put(f"/api/servers/{server_id}", json=update_data, content_type="application/json")
+        response = client.put(f"/api/servers/{config.id}", json=update_data, content_type="application/json")
 
         assert response.status_code == 200
         data = response.get_json()
         assert data["auto_connect"] is True
+        assert config_manager.load_configs()[config.id].auto_connect is True
+
+    def test_create_server_rejects_invalid_framing(self, client):
+        """Test a bad stdio framing is refused at save time instead of at connect time"""
+        from app import server_configs
+
+        server_data = {"name": "Bad Framing", "transport_type": "stdio", "config": {"command": "mcp-server", "framing": "xml"}}
+
+        response = client.post("/api/servers", json=server_data, content_type="application/json")
+
+        assert response.status_code == 400
+        assert "framing" in response.get_json()["error"]
+        assert all(config.name != "Bad Framing" for config in server_configs.values())
+
+    def test_update_server_rejects_invalid_framing(self, client):
+        """Test an update cannot store a bad stdio framing"""
+        from app import server_configs
+
+        config = ServerConfig(name="Stdio Server", transport_type="stdio", config={"command": "mcp-server"})
+        server_configs[config.id] = config
+
+        update_data = {"config": {"command": "mcp-server", "framing": "xml"}}
+        response = client.put(f"/api/servers/{config.id}", json=update_data, content_type="application/json")
+
+        assert response.status_code == 400
+        assert config.config == {"command": "mcp-server"}
@@ -0,0 +1,458 @@
+"""
+Tests for MCP transports
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+import websocket
+
+from mcp.client import MCPClient
+from mcp.transport import FRAMING_LENGTH_PREFIXED, HTTPTransport, StdioTransport, WebSocketTransport
+from mcp.transport_loop import reactor as shared_reactor
+
+# Minimal newline-delimited JSON-RPC server: answers every request with its own method and params
+ECHO_SERVER = """
+import json, sys
+for line in sys.stdin:
+    message = json.loads(line)
+    if "id" in message:
+        result = {"method": message["method"], "params": message.get("params", {})}
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": result}) + "\\n")
+        sys.stdout.flush()
+"""
+
+
+class RecordingReactor:
+    """Stand-in for the shared reactor that records registrations"""
+
+    def __init__(self):
+        self.registered = []
+        self.dedicated = []
+        self.unregistered = []
+
+    def register(self, fileobj, callback, dedicated=False):
+        self.registered.append(fileobj)
+        if dedicated:
+            self.dedicated.append(fileobj)
+
+    def unregister(self, fileobj):
+        self.unregistered.append(fileobj)
+
+
+@pytest.fixture
+def recording_reactor(monkeypatch):
+    reactor = RecordingReactor()
+    monkeypatch.setattr("mcp.transport.reactor", reactor)
+    return reactor
+
+
+@pytest.fixture
+def stdio_pipe():
+    """A pipe whose read end looks like a process stdout"""
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    with os.fdopen(read_fd, "rb", buffering=0) as stdout:
+        yield stdout, write_fd
+        try:
+            os.close(write_fd)
+        except OSError:
+            pass
+
+
+def make_stdio_transport(**kwargs):
+    """Build an unconnected stdio transport that records decoded payloads instead of handling them"""
+    transport = StdioTransport("unused", **kwargs)
+    transport.payloads = []
+    transport._handle_payload = lambda payload: transport.payloads.append(bytes(payload))
+    return transport
+
+
+def feed(transport, *chunks):
+    """Deliver chunks to the transport one read at a time"""
+    drain = transport._drain_length_prefixed if transport.framing == FRAMING_LENGTH_PREFIXED else transport._drain_lines
+    for chunk in chunks:
+        transport.read_buffer += chunk
+        drain()
+
+
+def frame(payload):
+    return len(payload).to_bytes(4, "big") + payload
+
+
+class TestStdioTransport:
+    """Test stdio transport reading"""
+
+    def test_eof_unregisters_stdout(self, recording_reactor, stdio_pipe):
+        """Test output before EOF is delivered and the closed pipe is unregistered"""
+        stdout, write_fd = stdio_pipe
+        transport = make_stdio_transport()
+        os.write(write_fd, b'{"id": 1}\n')
+        os.close(write_fd)
+
+        transport._on_readable(stdout)  # short read: data is delivered, EOF is seen on the next wakeup
+        transport._on_readable(stdout)
+
+        assert transport.payloads == [b'{"id": 1}']
+        assert recording_reactor.unregistered == [stdout]
+
+    def test_open_pipe_stays_registered(self, recording_reactor, stdio_pipe):
+        """Test a drained but open pipe is not unregistered"""
+        stdout, write_fd = stdio_pipe
+        transport = make_stdio_transport()
+        os.write(write_fd, b'{"id": 1}\n')
+
+        transport._on_readable(stdout)
+
+        assert transport.payloads == [b'{"id": 1}']
+        assert recording_reactor.unregistered == []
+
+    def test_round_trip_through_subprocess(self):
+        """Test requests reach a real server process and replies come back through the reactor"""
+        client = MCPClient(StdioTransport(sys.executable, ["-c", ECHO_SERVER]))
+        client.connect()
+        try:
+            response = client._send_request("tools/list", {"cursor": "x" * 200_000}, timeout=10)
+        finally:
+            client.disconnect()
+
+        assert response["result"]["method"] == "tools/list"
+        assert len(response["result"]["params"]["cursor"]) == 200_000
+
+
+class TestLengthPrefixedFraming:
+    """Test length-prefixed frame reassembly"""
+
+    def test_frame_split_across_chunks(self):
+        """Test a frame is dispatched only once its last byte arrives"""
+        transport = make_stdio_transport(framing=FRAMING_LENGTH_PREFIXED)
+        data = frame(b'{"id": 1, "result": {}}')
+
+        feed(transport, data[:6], data[6:15])
+        assert transport.payloads == []
+
+        feed(transport, data[15:])
+        assert transport.payloads == [b'{"id": 1, "result": {}}']
+        assert transport.read_buffer == b""
+
+    def test_split_inside_header(self):
+        """Test a header split over several reads is reassembled"""
+        transport = make_stdio_transport(framing=FRAMING_LENGTH_PREFIXED)
+        data = frame(b'{"id": 1}') + frame(b'{"id": 2}')
+
+        feed(transport, data[:1], data[1:3], data[3:15], data[15:])
+
+        assert transport.payloads == [b'{"id": 1}', b'{"id": 2}']
+        assert transport.read_buffer == b""
+
+    def test_several_frames_in_one_chunk(self):
+        """Test every complete frame in a read is dispatched and the remainder is kept"""
+        transport = make_stdio_transport(framing=FRAMING_LENGTH_PREFIXED)
+        tail = frame(b'{"id": 3}')
+
+        feed(transport, frame(b'{"id": 1}') + frame(b'{"id": 2}') + tail[:5])
+
+        assert transport.payloads == [b'{"id": 1}', b'{"id": 2}']
+        assert transport.read_buffer == tail[:5]
+
+    def test_oversized_frame_is_dropped(self, monkeypatch):
+        """Test a frame over the limit is skipped, even across reads, and later frames still arrive"""
+        monkeypatch.setattr("mcp.transport.MAX_FRAME_SIZE", 16)
+        transport = make_stdio_transport(framing=FRAMING_LENGTH_PREFIXED)
+        data = frame(b"x" * 100) + frame(b'{"id": 2}')
+
+        feed(transport, data[:10], data[10:60], data[60:])
+
+        assert transport.payloads == [b'{"id": 2}']
+        assert transport.read_buffer == b""
+        assert transport.discard_remaining == 0
+
+    def test_oversized_frame_does_not_buffer_its_body(self, monkeypatch):
+        """Test the body of an oversized frame is discarded as it arrives instead of accumulated"""
+        monkeypatch.setattr("mcp.transport.MAX_FRAME_SIZE", 16)
+        transport = make_stdio_transport(framing=FRAMING_LENGTH_PREFIXED)
+
+        feed(transport, frame(b"x" * 1000)[:500])
+
+        assert transport.read_buffer == b""
+        assert transport.discard_remaining == 504
+
+
+class TestLineFraming:
+    """Test newline-delimited message reassembly"""
+
+    def test_message_split_over_many_chunks(self):
+        """Test a long line is dispatched once and already-scanned bytes are not searched again"""
+        transport = make_stdio_transport()
+        message = b'{"id": 1, "result": {"text": "' + b"x" * 1000 + b'"}}'
+        chunks = [message[i : i + 100] for i in range(0, len(message), 100)]
+
+        for count, chunk in enumerate(chunks, 1):
+            feed(transport, chunk)
+            assert transport.scan_offset == len(transport.read_buffer) == min(count * 100, len(message))
+
+        assert transport.payloads == []
+
+        feed(transport, b"\n")
+        assert transport.payloads == [message]
+        assert transport.read_buffer == b""
+        assert transport.scan_offset == 0
+
+    def test_several_messages_in_one_chunk(self):
+        """Test every complete line in a read is dispatched and the partial tail is kept"""
+        transport = make_stdio_transport()
+
+        feed(transport, b'{"id": 1}\n{"id": 2}\n{"id": 3}\n{"id"')
+
+        assert transport.payloads == [b'{"id": 1}', b'{"id": 2}', b'{"id": 3}']
+        assert transport.read_buffer == b'{"id"'
+        assert transport.scan_offset == 5
+
+        feed(transport, b": 4}\n")
+        assert transport.payloads[-1] == b'{"id": 4}'
+
+    def test_crlf_and_blank_lines(self):
+        """Test CRLF endings are stripped and blank lines are skipped"""
+        transport = make_stdio_transport()
+
+        feed(transport, b'{"id": 1}\r\n\r\n\n  \n{"id": 2}\r', b"\n")
+
+        assert transport.payloads == [b'{"id": 1}', b'{"id": 2}']
+        assert transport.read_buffer == b""
+
+    def test_connect_resets_buffer_and_scan_offset(self, recording_reactor):
+        """Test a reconnect does not reuse a stale partial line or scan position"""
+        transport = make_stdio_transport()
+        feed(transport, b'{"id": 1, "partial')
+        assert transport.scan_offset > 0
+
+        transport.command = sys.executable
+        transport.args = ["-c", "import sys; sys.stdin.read()"]
+        transport.connect()
+        try:
+            assert transport.read_buffer == b""
+            assert transport.scan_offset == 0
+            assert recording_reactor.registered == [transport.process.stdout]
+        finally:
+            transport.disconnect()
+
+        feed(transport, b'{"id": 2}\n')
+        assert transport.payloads == [b'{"id": 2}']
+
+
+@pytest.fixture
+def mock_httpx(monkeypatch):
+    """Route HTTPTransport's httpx branch through httpx.MockTransport and record each client it builds"""
+    requests_seen = []
+    clients = []
+
+    def handler(request):
+        requests_seen.append(request)
+        if request.url.path == "/old":
+            return httpx.Response(307, headers={"Location": "/mcp"})
+
+        message = orjson.loads(request.content)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": message["id"], "result": {}})
+
+    def make_client(**kwargs):
+        clients.append(dict(kwargs))
+        kwargs["http2"] = False  # h2 may not be installed; MockTransport never negotiates HTTP/2 anyway
+        return httpx.Client(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr("mcp.transport.httpx", SimpleNamespace(Client=make_client, Limits=httpx.Limits))
+    return SimpleNamespace(requests=requests_seen, clients=clients)
+
+
+class TestHTTPXClient:
+    """Test the httpx branch of HTTPTransport"""
+
+    MESSAGE = {"jsonrpc": "2.0", "id": "1", "method": "tools/list"}
+
+    def test_post_uses_session_headers(self, mock_httpx):
+        """Test messages are POSTed as JSON with the configured headers"""
+        transport = HTTPTransport("http://mcp.test/mcp", headers={"Authorization": "Bearer token"})
+        transport.connect()
+
+        result = transport.send_message(self.MESSAGE)
+
+        request = mock_httpx.requests[0]
+        assert result == {"jsonrpc": "2.0", "id": "1", "result": {}}
+        assert request.method == "POST"
+        assert request.headers["Authorization"] == "Bearer token"
+        assert request.headers["Content-Type"] == "application/json"
+        assert mock_httpx.clients[0]["http2"] is True
+        transport.disconnect()
+
+    def test_redirects_are_followed(self, mock_httpx):
+        """Test a moved endpoint is followed like the requests fallback does"""
+        transport = HTTPTransport("http://mcp.test/old")
+        transport.connect()
+
+        result = transport.send_message(self.MESSAGE)
+
+        assert result["id"] == "1"
+        assert [request.url.path for request in mock_httpx.requests] == ["/old", "/mcp"]
+        assert orjson.loads(mock_httpx.requests[1].content) == self.MESSAGE
+        transport.disconnect()
+
+    def test_reconnect_after_disconnect_uses_new_client(self, mock_httpx):
+        """Test a closed client is replaced on connect instead of failing every request"""
+        transport = HTTPTransport("http://mcp.test/mcp")
+        transport.connect()
+        transport.disconnect()
+
+        transport.connect()
+        result = transport.send_message(self.MESSAGE)
+
+        assert result["id"] == "1"
+        assert len(mock_httpx.clients) == 2
+        transport.disconnect()
+
+
+class ScriptedWebSocket:
+    """Fake websocket-client connection whose recv_data replays a script of frames and exceptions"""
+
+    def __init__(self, *script):
+        self.sock = object()
+        self.script = list(script)
+
+    def recv_data(self, control_frame=False):
+        assert control_frame
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+class MessageRecorder:
+    """Message handler that records messages delivered from the handler pool"""
+
+    def __init__(self):
+        self.messages = []
+        self.received = threading.Event()
+
+    def __call__(self, message):
+        self.messages.append(message)
+        self.received.set()
+
+
+def make_websocket_transport(ws):
+    """Build a websocket transport that is already connected to ws"""
+    transport = WebSocketTransport("ws://mcp.test")
+    transport.websocket = ws
+    transport.running = transport.connected = True
+    transport.set_message_handler(MessageRecorder())
+    return transport
+
+
+def server_frame(data, opcode=websocket.ABNF.OPCODE_TEXT):
+    """Encode a frame as a server sends it: unmasked"""
+    frame = websocket.ABNF.create_frame(data, opcode)
+    frame.mask = 0
+    return frame.format()
+
+
+class TestWebSocketReader:
+    """Test WebSocket frame reading"""
+
+    def test_text_frame_reaches_message_handler(self, recording_reactor):
+        """Test a JSON text frame is decoded and handed to the message handler"""
+        transport = make_websocket_transport(ScriptedWebSocket((websocket.ABNF.OPCODE_TEXT, b'{"id": 1}')))
+
+        transport._read_frame(transport.websocket.sock)
+
+        assert transport.message_handler.received.wait(2)
+        assert transport.message_handler.messages == [{"id": 1}]
+        assert transport.connected is True
+        assert recording_reactor.unregistered == []
+
+    @pytest.mark.parametrize(
+        "step",
+        [
+            (websocket.ABNF.OPCODE_PING, b"hi"),
+            (websocket.ABNF.OPCODE_PONG, b""),
+            websocket.WebSocketTimeoutException("timed out"),
+        ],
+    )
+    def test_control_frames_and_timeouts_keep_reading(self, recording_reactor, step):
+        """Test pings, pongs and idle timeouts leave the transport connected and registered"""
+        transport = make_websocket_transport(ScriptedWebSocket(step, (websocket.ABNF.OPCODE_TEXT, b'{"id": 2}')))
+        sock = transport.websocket.sock
+
+        transport._read_frame(sock)
+        transport._read_frame(sock)
+
+        assert transport.message_handler.received.wait(2)
+        assert transport.message_handler.messages == [{"id": 2}]
+        assert transport.connected is True
+        assert recording_reactor.unregistered == []
+
+    @pytest.mark.parametrize(
+        "step",
+        [
+            (websocket.ABNF.OPCODE_CLOSE, b""),
+            websocket.WebSocketConnectionClosedException("closed"),
+            OSError("connection reset"),
+        ],
+    )
+    def test_close_disconnects_and_unregisters(self, recording_reactor, step):
+        """Test a close frame or dropped connection marks the transport disconnected"""
+        transport = make_websocket_transport(ScriptedWebSocket(step))
+        sock = transport.websocket.sock
+
+        transport._read_frame(sock)
+
+        assert transport.connected is False
+        assert recording_reactor.unregistered == [sock]
+        assert transport.message_handler.messages == []
+
+    def test_connect_uses_dedicated_reader(self, recording_reactor, monkeypatch):
+        """Test connect registers the socket for its own reader thread"""
+        ws = ScriptedWebSocket()
+        monkeypatch.setattr("mcp.transport.websocket.create_connection", lambda *args, **kwargs: ws)
+        transport = WebSocketTransport("ws://mcp.test")
+
+        transport.connect()
+
+        assert recording_reactor.dedicated == [ws.sock]
+
+    def test_reader_thread_over_socketpair(self, monkeypatch):
+        """Test the dedicated reader survives pings and timeouts, delivers messages, and stops on close"""
+        client_sock, server_sock = socket.socketpair()
+        ws = websocket.WebSocket()
+        ws.sock = client_sock
+        ws.connected = True
+        ws.settimeout(0.05)  # short socket timeout so the reader loops through timeouts
+        monkeypatch.setattr("mcp.transport.websocket.create_connection", lambda *args, **kwargs: ws)
+        transport = WebSocketTransport("ws://mcp.test")
+        recorder = MessageRecorder()
+        transport.set_message_handler(recorder)
+
+        try:
+            transport.connect()
+            reader = shared_reactor.fallback_threads[client_sock]
+
+            server_sock.sendall(server_frame(b"ping", websocket.ABNF.OPCODE_PING))
+            time.sleep(0.2)
+            server_sock.sendall(server_frame(b'{"id": 3}'))
+
+            assert recorder.received.wait(2)
+            assert recorder.messages == [{"id": 3}]
+            assert reader.is_alive()
+            assert transport.connected is True
+
+            server_sock.sendall(server_frame(b"", websocket.ABNF.OPCODE_CLOSE))
+            reader.join(2)
+
+            assert not reader.is_alive()
+            assert transport.connected is False
+            assert client_sock not in shared_reactor.fallback_threads
+        finally:
+            transport.disconnect()
+            server_sock.close()
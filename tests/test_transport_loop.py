@@ -0,0 +1,176 @@
+"""
+Tests for the shared transport reactor
+"""
+import os
+import selectors
+import socket
+import threading
+
+import pytest
+
+from mcp.transport_loop import Reactor
+
+WAIT = 2
+
+
+class PipeReader:
+    """Reactor callback that drains a pipe and records what it read"""
+
+    def __init__(self):
+        self.chunks = []
+        self.received = threading.Event()
+
+    def __call__(self, fd):
+        chunk = os.read(fd, 4096)
+        if chunk:
+            self.chunks.append(chunk)
+            self.received.set()
+
+
+@pytest.fixture
+def reactor():
+    reactor = Reactor(select_timeout=0.05)
+    yield reactor
+    for fileobj in list(reactor.selector.get_map()) + list(reactor.fallback_threads):
+        reactor.unregister(fileobj)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    for fd in (read_fd, write_fd):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+class TestReactor:
+    """Test Reactor registration and thread lifecycle"""
+
+    def test_register_dispatches_readable_pipe(self, reactor, pipe):
+        """Test data written to a registered pipe reaches its callback"""
+        read_fd, write_fd = pipe
+        reader = PipeReader()
+
+        reactor.register(read_fd, reader)
+        os.write(write_fd, b"hello")
+
+        assert reader.received.wait(WAIT)
+        assert reader.chunks == [b"hello"]
+        assert reactor.running is True
+
+    def test_unregister_stops_callbacks_and_idle_thread_exits(self, reactor, pipe):
+        """Test the reactor thread exits once nothing is registered"""
+        read_fd, write_fd = pipe
+        reader = PipeReader()
+        reactor.register(read_fd, reader)
+        thread = reactor.thread
+
+        reactor.unregister(read_fd)
+        reactor.unregister(read_fd)  # safe to repeat
+        thread.join(WAIT)
+        os.write(write_fd, b"ignored")
+
+        assert not thread.is_alive()
+        assert reactor.running is False
+        assert not reader.received.wait(0.2)
+
+    def test_register_restarts_stopped_thread(self, reactor, pipe):
+        """Test a connect after the reactor went idle starts a new reader thread"""
+        read_fd, write_fd = pipe
+        first = PipeReader()
+        reactor.register(read_fd, first)
+        old_thread = reactor.thread
+        reactor.unregister(read_fd)
+        old_thread.join(WAIT)
+
+        second = PipeReader()
+        reactor.register(read_fd, second)
+        os.write(write_fd, b"again")
+
+        assert second.received.wait(WAIT)
+        assert reactor.thread is not old_thread
+        assert reactor.thread.is_alive()
+
+    def test_select_selector_sends_pipes_to_blocking_reader(self, pipe):
+        """Test pipes bypass SelectSelector, which only polls sockets on Windows"""
+        reactor = Reactor(select_timeout=0.05, selector=selectors.SelectSelector())
+        read_fd, write_fd = pipe
+        reader = PipeReader()
+
+        reactor.register(read_fd, reader)
+        os.write(write_fd, b"data")
+
+        assert reader.received.wait(WAIT)
+        assert read_fd in reactor.fallback_threads
+        assert not reactor.selector.get_map()
+        assert reactor.thread is None
+
+        reactor.unregister(read_fd)
+        os.close(write_fd)  # EOF wakes the blocked read so the thread can notice
+
+    def test_dedicated_reader_uses_own_thread(self, reactor, pipe):
+        """Test dedicated registrations never run on the shared reactor thread"""
+        read_fd, write_fd = pipe
+        reader = PipeReader()
+
+        reactor.register(read_fd, reader, dedicated=True)
+        os.write(write_fd, b"data")
+
+        assert reader.received.wait(WAIT)
+        assert read_fd in reactor.fallback_threads
+        assert reactor.thread is None
+
+        reactor.unregister(read_fd)
+        os.close(write_fd)
+
+    def test_closed_socket_is_dropped_without_stopping_reactor(self):
+        """Test a file closed while registered does not kill the reader thread"""
+        reactor = Reactor(select_timeout=0.05, selector=selectors.SelectSelector())
+        dead, dead_peer = socket.socketpair()
+        live, live_peer = socket.socketpair()
+        reader_calls = []
+        received = threading.Event()
+
+        def on_live(sock):
+            reader_calls.append(sock.recv(4096))
+            received.set()
+
+        try:
+            reactor.register(dead, lambda sock: None)
+            os.close(dead.detach())  # closed behind the selector's back
+            reactor.register(live, on_live)
+            live_peer.sendall(b"ping")
+
+            assert received.wait(WAIT)
+            assert reader_calls == [b"ping"]
+            assert reactor.thread.is_alive()
+        finally:
+            reactor.unregister(live)
+            for sock in (dead, dead_peer, live, live_peer):
+                sock.close()
+
+    def test_select_failure_stops_cleanly_and_allows_restart(self, reactor, pipe):
+        """Test an unrecoverable select error ends the thread and clears running"""
+        read_fd, write_fd = pipe
+
+        def failing_select(timeout=None):
+            raise OSError("select failed")
+
+        real_select = reactor.selector.select
+        reactor.selector.select = failing_select
+        reactor.register(read_fd, PipeReader())
+        reactor.thread.join(WAIT)
+
+        assert not reactor.thread.is_alive()
+        assert reactor.running is False
+
+        reactor.selector.select = real_select
+        reactor.unregister(read_fd)
+        reader = PipeReader()
+        reactor.register(read_fd, reader)
+        os.write(write_fd, b"recovered")
+
+        assert reader.received.wait(WAIT)
@@ -2,13 +2,34 @@
 Tests for input validation and error handling
 """
 
-from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import patch
 
+import httpx
 import pytest
+from anthropic import APIConnectionError, AuthenticationError, RateLimitError
 
-from app import sanitize_html_content, validate_chat_message
+from app import sanitize_html_content, validate_chat_message, validate_server_config
 from chat.service import ChatService
 
+_API_REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+
+def _api_response(status_code):
+    """Build a minimal HTTP response for constructing anthropic status errors"""
+    return httpx.Response(status_code, request=_API_REQUEST)
+
+
+class _RaisingAnthropic:
+    """Stand-in Anthropic client whose messages.create raises a fixed error"""
+
+    def __init__(self, error):
+        self.error = error
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        raise self.error
+
 
 class TestInputValidation:
     """Test input validation functions"""
@@ -58,6 +79,21 @@ class TestInputValidation:
         assert is_valid is False
         assert "potentially dangerous content" in error
 
+    @pytest.mark.parametrize(
+        "message, is_dangerous",
+        [
+            ("<SCRIPT src='x.js'>\n</script>", True),
+            ("What does a <script> tag do?", False),
+            ("</script> comes before <script>", False),
+            ("<script" * 1400, False),
+            ("<script>" * 1250, False),
+        ],
+    )
+    def test_validate_chat_message_script_detection(self, message, is_dangerous):
+        """Test only complete script elements are rejected, including on adversarial input"""
+        is_valid, _ = validate_chat_message(message)
+        assert is_valid is not is_dangerous
+
     def test_sanitize_html_content_basic(self):
         """Test basic HTML sanitization"""
         content = "<div>Hello & goodbye</div>"
@@ -75,204 +111,168 @@ class TestInputValidation:
         assert sanitize_html_content("") == ""
         assert sanitize_html_content(None) is None
 
+    @pytest.mark.parametrize(
+        "transport_type, config",
+        [
+            ("stdio", {"command": "mcp-server"}),
+            ("stdio", {"command": "mcp-server", "framing": "jsonl"}),
+            ("stdio", {"command": "mcp-server", "framing": "length-prefixed"}),
+            ("http", {"url": "http://example.com", "framing": "ignored"}),
+        ],
+    )
+    def test_validate_server_config_valid(self, transport_type, config):
+        """Test framing is optional and only checked for stdio servers"""
+        assert validate_server_config(transport_type, config) == (True, "")
+
+    def test_validate_server_config_invalid_framing(self):
+        """Test an unknown stdio framing is rejected with the allowed values"""
+        is_valid, error = validate_server_config("stdio", {"command": "mcp-server", "framing": "ndjson"})
+        assert is_valid is False
+        assert "jsonl, length-prefixed" in error
+
+    def test_validate_server_config_not_object(self):
+        """Test a non-object config is rejected"""
+        is_valid, error = validate_server_config("stdio", ["mcp-server"])
+        assert is_valid is False
+        assert "must be an object" in error
+
 
 class TestApiKeyValidation:
     """Test API key validation"""
 
-    def test_validate_api_key_valid_anthropic(self):
+    @pytest.fixture(scope="class")
+    def svc(self):
+        """Create one chat service for the class; key validation does not touch its state"""
+        return ChatService()
+
+    def test_validate_api_key_valid_anthropic(self, svc):
         """Test valid Anthropic API key format"""
-        service = ChatService()
         valid_key = "sk-ant-" + "a" * 100  # Valid format and length
-        assert service._validate_api_key(valid_key) is True
+        assert svc._validate_api_key(valid_key) is True
 
-    def test_validate_api_key_test_keys(self):
+    def test_validate_api_key_test_keys(self, svc):
         """Test that test keys are allowed"""
-        service = ChatService()
-        assert service._validate_api_key("test-key") is True
-        assert service._validate_api_key("direct-key") is True
-        assert service._validate_api_key("mock-key") is True
+        assert svc._validate_api_key("test-key") is True
+        assert svc._validate_api_key("direct-key") is True
+        assert svc._validate_api_key("mock-key") is True
 
-    def test_validate_api_key_invalid_prefix(self):
+    def test_validate_api_key_invalid_prefix(self, svc):
         """Test invalid API key prefix"""
-        service = ChatService()
-        assert service._validate_api_key("invalid-key") is False
+        assert svc._validate_api_key("invalid-key") is False
 
-    def test_validate_api_key_too_short(self):
+    def test_validate_api_key_too_short(self, svc):
         """Test API key that's too short"""
-        service = ChatService()
         short_key = "sk-ant-short"
-        assert service._validate_api_key(short_key) is False
+        assert svc._validate_api_key(short_key) is False
 
-    def test_validate_api_key_too_long(self):
+    def test_validate_api_key_too_long(self, svc):
         """Test API key that's too long"""
-        service = ChatService()
         long_key = "sk-ant-" + "a" * 300
-        assert service._validate_api_key(long_key) is False
+        assert svc._validate_api_key(long_key) is False
 
-    def test_validate_api_key_invalid_characters(self):
+    def test_validate_api_key_invalid_characters(self, svc):
         """Test API key with invalid characters"""
-        service = ChatService()
         invalid_key = "sk-ant-" + "a" * 50 + "!@#$%"
-        assert service._validate_api_key(invalid_key) is False
+        assert svc._validate_api_key(invalid_key) is False
 
-    def test_validate_api_key_none_or_empty(self):
+    def test_validate_api_key_none_or_empty(self, svc):
         """Test None or empty API key"""
-        service = ChatService()
-        assert service._validate_api_key(None) is False
-        assert service._validate_api_key("") is False
-        assert service._validate_api_key(123) is False
+        assert svc._validate_api_key(None) is False
+        assert svc._validate_api_key("") is False
+        assert svc._validate_api_key(123) is False
 
 
 class TestErrorHandling:
     """Test error handling in ChatService"""
 
-    @patch("anthropic.Anthropic")
-    def test_anthropic_authentication_error(self, mock_anthropic_class):
-        """Test handling of authentication errors"""
-        mock_client = MagicMock()
-        mock_anthropic_class.return_value = mock_client
-
-        # Mock the messages.create to raise AuthenticationError
-        from anthropic import AuthenticationError
-
-        # Create a proper mock response and error
-        mock_response = MagicMock()
-        mock_response.status_code = 401
-        error = AuthenticationError("Invalid API key", response=mock_response, body={})
-        mock_client.messages.create.side_effect = error
-
-        with patch.object(ChatService, "_test_api_key"):
+    @pytest.mark.parametrize(
+        "error, expected",
+        [
+            pytest.param(
+                AuthenticationError("Invalid API key", response=_api_response(401), body={}),
+                "authentication issue",
+                id="authentication",
+            ),
+            pytest.param(
+                RateLimitError("Rate limit exceeded", response=_api_response(429), body={}),
+                "rate limited",
+                id="rate_limit",
+            ),
+            pytest.param(APIConnectionError(request=_API_REQUEST), "trouble connecting", id="connection"),
+            pytest.param(Exception("Unexpected error"), "unexpected error", id="generic"),
+        ],
+    )
+    def test_claude_api_errors_are_reported(self, error, expected):
+        """Test Claude API errors become an assistant message instead of raising"""
+        client = _RaisingAnthropic(error)
+        with patch("anthropic.Anthropic", lambda api_key: client), patch.object(ChatService, "_test_api_key"):
             service = ChatService(anthropic_api_key="test-key")
             session = service.create_session()
 
-            # This should handle the error gracefully
             result = service.send_message(session.id, "Hello")
 
-            assert result.role == "assistant"
-            assert "authentication issue" in result.content.lower()
-
-    @patch("anthropic.Anthropic")
-    def test_anthropic_rate_limit_error(self, mock_anthropic_class):
-        """Test handling of rate limit errors"""
-        mock_client = MagicMock()
-        mock_anthropic_class.return_value = mock_client
-
-        from anthropic import RateLimitError
-
-        mock_response = MagicMock()
-        mock_response.status_code = 429
-        error = RateLimitError("Rate limit exceeded", response=mock_response, body={})
-        mock_client.messages.create.side_effect = error
-
-        with patch.object(ChatService, "_test_api_key"):
-            service = ChatService(anthropic_api_key="test-key")
-            session = service.create_session()
-
-            result = service.send_message(session.id, "Hello")
-
-            assert result.role == "assistant"
-            assert "rate limited" in result.content.lower()
-
-    @patch("anthropic.Anthropic")
-    def test_anthropic_connection_error(self, mock_anthropic_class):
-        """Test handling of connection errors"""
-        mock_client = MagicMock()
-        mock_anthropic_class.return_value = mock_client
-
-        from anthropic import APIConnectionError
-
-        # APIConnectionError doesn't take a message argument, just use Exception
-        error = APIConnectionError(request=MagicMock())
-        mock_client.messages.create.side_effect = error
-
-        with patch.object(ChatService, "_test_api_key"):
-            service = ChatService(anthropic_api_key="test-key")
-            session = service.create_session()
-
-            result = service.send_message(session.id, "Hello")
-
-            assert result.role == "assistant"
-            assert "trouble connecting" in result.content.lower()
-
-    @patch("anthropic.Anthropic")
-    def test_generic_exception_handling(self, mock_anthropic_class):
-        """Test handling of generic exceptions"""
-        mock_client = MagicMock()
-        mock_anthropic_class.return_value = mock_client
-
-        mock_client.messages.create.side_effect = Exception("Unexpected error")
-
-        with patch.object(ChatService, "_test_api_key"):
-            service = ChatService(anthropic_api_key="test-key")
-            session = service.create_session()
-
-            result = service.send_message(session.id, "Hello")
-
-            assert result.role == "assistant"
-            assert "unexpected error" in result.content.lower()
+        assert result.role == "assistant"
+        assert expected in result.content.lower()
 
 
 class TestToolResultFormatting:
     """Test tool result formatting functionality"""
 
-    def test_format_tool_result_string(self):
+    @pytest.fixture(scope="class")
+    def svc(self):
+        """Create one chat service for the class; result formatting is stateless"""
+        return ChatService()
+
+    def test_format_tool_result_string(self, svc):
         """Test formatting simple string results"""
-        service = ChatService()
-        result = service._format_tool_result("test_tool", "Hello world")
+        result = svc._format_tool_result("test_tool", "Hello world")
         assert result == "Result: Hello world"
 
-    def test_format_tool_result_json_string(self):
+    def test_format_tool_result_json_string(self, svc):
         """Test formatting JSON string results"""
-        service = ChatService()
         json_string = '{"message": "Hello", "status": "success"}'
-        result = service._format_tool_result("test_tool", json_string)
+        result = svc._format_tool_result("test_tool", json_string)
         assert "• message: Hello" in result
         assert "• status: success" in result
 
-    def test_format_tool_result_simple_dict(self):
+    def test_format_tool_result_simple_dict(self, svc):
         """Test formatting simple dictionary results"""
-        service = ChatService()
         data = {"name": "John", "age": 30, "active": True}
-        result = service._format_tool_result("test_tool", data)
+        result = svc._format_tool_result("test_tool", data)
         assert "• name: John" in result
         assert "• age: 30" in result
         assert "• active: True" in result
 
-    def test_format_tool_result_complex_dict(self):
+    def test_format_tool_result_complex_dict(self, svc):
         """Test formatting complex dictionary results"""
-        service = ChatService()
         data = {"users": [{"name": "John"}, {"name": "Jane"}], "total": 2}
-        result = service._format_tool_result("test_tool", data)
+        result = svc._format_tool_result("test_tool", data)
         # Should fall back to JSON formatting for complex data
         assert '"users"' in result
         assert '"total": 2' in result
 
-    def test_format_tool_result_simple_list(self):
+    def test_format_tool_result_simple_list(self, svc):
         """Test formatting simple list results"""
-        service = ChatService()
         data = ["apple", "banana", "cherry"]
-        result = service._format_tool_result("test_tool", data)
+        result = svc._format_tool_result("test_tool", data)
         assert "• apple" in result
         assert "• banana" in result
         assert "• cherry" in result
 
-    def test_format_tool_result_complex_list(self):
+    def test_format_tool_result_complex_list(self, svc):
         """Test formatting complex list results"""
-        service = ChatService()
         data = [{"name": "John"}, {"name": "Jane"}]
-        result = service._format_tool_result("test_tool", data)
+        result = svc._format_tool_result("test_tool", data)
         # Should fall back to JSON formatting
         assert '"name": "John"' in result
         assert '"name": "Jane"' in result
 
-    def test_format_tool_result_empty_data(self):
+    def test_format_tool_result_empty_data(self, svc):
         """Test formatting empty data"""
-        service = ChatService()
-        assert "Empty data" in service._format_tool_result("test_tool", {})
-        assert "Empty list" in service._format_tool_result("test_tool", [])
+        assert "Empty data" in svc._format_tool_result("test_tool", {})
+        assert "Empty list" in svc._format_tool_result("test_tool", [])
 
-    def test_format_tool_result_none(self):
+    def test_format_tool_result_none(self, svc):
         """Test formatting None result"""
-        service = ChatService()
-        result = service._format_tool_result("test_tool", None)
+        result = svc._format_tool_result("test_tool", None)
         assert result == "Result: No data returned"